@@ -0,0 +1,45 @@
+class Channel:
+    """
+    Compact record for one playlist entry.
+    Uses __slots__ instead of a per-channel dict; tens of thousands of these
+    live in memory at once.
+    """
+    __slots__ = ('name', 'url', 'group', 'tvg_id', 'tvg_logo', 'tvg_country',
+                 'tvg_language', 'user_agent', 'referer')
+
+    def __init__(self, name, url, group, tvg_id=None, tvg_logo=None, tvg_country=None,
+                 tvg_language=None, user_agent=None, referer=None):
+        self.name = name
+        self.url = url
+        self.group = group
+        self.tvg_id = tvg_id
+        self.tvg_logo = tvg_logo
+        self.tvg_country = tvg_country
+        self.tvg_language = tvg_language
+        self.user_agent = user_agent
+        self.referer = referer
+
+    # Dict-style access so code written against the old {'name', 'url'} dicts
+    # (and VideoPlayer.load_stream) keeps working unchanged
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError):
+            raise KeyError(key)
+
+    def get(self, key, default=None):
+        value = getattr(self, key, None)
+        return default if value is None else value
+
+    def to_row(self):
+        return tuple(getattr(self, k) for k in self.__slots__)
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(*row)
+
+    def to_dict(self):
+        return {k: getattr(self, k) for k in self.__slots__ if getattr(self, k) is not None}
+
+    def __repr__(self):
+        return f"Channel({self.name!r}, {self.url!r}, {self.group!r})"
@@ -1,39 +1,128 @@
+import os
 import requests
 import threading
-import concurrent.futures
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from core.channel import Channel
+from core.health_db import HealthStore
+from core.m3u_parser import iter_m3u, iter_m3u_chunks
+from core.playlist_cache import PlaylistCache
+from core.prober import USER_AGENT, HostCircuitBreaker, StreamProber
+from core.reverify_scheduler import ReverifyScheduler
+from core.search_index import ChannelIndex
+from core.verify_job import VerifyJob
+
+PLAYLIST_URL = "https://iptv-org.github.io/iptv/index.country.m3u"
+
+# Below this many literal hits, search_channels tops up with fuzzy matches
+FUZZY_MIN_RESULTS = 10
+FUZZY_LIMIT = 50
+
+# Stream checks go through the prober's own pools; the requests session only
+# serves the playlist download and other one-off fetches
+HTTP_POOL_HOSTS = 4
+HTTP_POOL_SIZE = 4
+
+def make_http_session(pool_hosts=HTTP_POOL_HOSTS, pool_size=HTTP_POOL_SIZE):
+    """
+    requests.Session with explicitly sized keep-alive pools and a small retry
+    budget for flaky gateways, instead of the library defaults.
+    """
+    session = requests.Session()
+    retry = Retry(total=2, connect=2, read=1, backoff_factor=0.5,
+                  status_forcelist=(502, 503, 504), allowed_methods=("GET", "HEAD"))
+    adapter = HTTPAdapter(pool_connections=pool_hosts, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({'User-Agent': USER_AGENT})
+    return session
 
 class ChannelManager:
-    def __init__(self):
+    def __init__(self, cache_dir="cache", health_ttl_ok=None, health_ttl_fail=None):
+        # {group: {url: Channel}}: insertion ordered, O(1) removal
         self.channels_by_category = {}
+        # {url: [Channel, ...]}: the same stream can be listed under several countries
+        self.channels_by_url = {}
         self.is_loading = False
         self.total_channels = 0
         self.verified_count = 0
         
+        # Bumped every time channels_by_category is swapped for new data
+        self.revision = 0
+        # Search index, built on the first query after a publish (see _search_index)
+        self.index = None
+        self._index_lock = threading.Lock()
+        self.playlist_cache = PlaylistCache(cache_dir)
+        
+        # Async health checks (shared by single tests, categories and favorites).
+        # Bulk and interactive checks use separate connection pools and slots.
+        # Dead hosts trip the breaker so their remaining urls are not waited on.
+        self.host_breaker = HostCircuitBreaker()
+        self.prober = StreamProber(breaker=self.host_breaker)
+        
+        # Probe outcomes survive restarts; fresh ones are reused instead of re-probing
+        self.health = HealthStore(os.path.join(cache_dir, "health.db"))
+        if health_ttl_ok is not None: self.health.ttl_ok = health_ttl_ok
+        if health_ttl_fail is not None: self.health.ttl_fail = health_ttl_fail
+        
+        # Running category verifications, {group: VerifyJob}; jobs finish on the
+        # prober loop thread, so the dict is only touched under _jobs_lock
+        self.verify_jobs = {}
+        self._jobs_lock = threading.Lock()
+        
+        # Low priority re-probing in the background; the UI starts it and feeds it
+        # favorites, played streams and open categories
+        self.scheduler = ReverifyScheduler(self)
+        
         # Session for faster reuse
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-        })
+        self.session = make_http_session()
         
-    def fetch_channels(self, on_complete=None, on_progress=None):
+    def close(self):
+        self.scheduler.stop()
+        for job in self.running_jobs():
+            job.cancel()
+        self.prober.close()
+        self.health.close()
+        self.session.close()
+        
+    def fetch_channels(self, on_complete=None, on_progress=None, on_chunk=None):
         """
         Fetches channels in background (No Auto-Verify to save speed).
+        on_progress: function(bytes_done, bytes_total, message) while downloading
+        on_chunk: function([Channel, ...]) as channels arrive, only when
+                  nothing was loaded yet (a refresh swaps in at the end instead)
+        on_complete may run twice: once the cached list is shown (is_loading
+        still set) and once the refresh is done.
+        Returns False if a fetch is already running.
         """
+        if self.is_loading:
+            return False
         self.is_loading = True
-        t = threading.Thread(target=self._fetch_worker, args=(on_complete, on_progress), daemon=True)
+        t = threading.Thread(target=self._fetch_worker, args=(on_complete, on_progress, on_chunk), daemon=True)
         t.start()
+        return True
         
-    def _fetch_worker(self, on_complete, on_progress):
+    def _fetch_worker(self, on_complete, on_progress, on_chunk):
         try:
-            # 1. Fetch the raw list
-            url = "https://iptv-org.github.io/iptv/index.country.m3u"
-            if on_progress: on_progress(0, 0, "Downloading List...")
+            # 0. Cold start: show the cached list without touching the network
+            if not self.channels_by_category and self._load_cached():
+                if on_complete: on_complete()
+            
+            # 1. Conditional refresh (304 keeps the data we already have)
+            if on_progress: on_progress(0, 0, "Checking for updates...")
+            headers = self.playlist_cache.conditional_headers()
             
-            r = self.session.get(url, timeout=15)
-            if r.status_code == 200:
-                self._parse_m3u(r.text)
-            else:
-                print("Failed to fetch channels")
+            with self.session.get(PLAYLIST_URL, headers=headers, timeout=15, stream=True) as r:
+                if r.status_code == 304:
+                    self.playlist_cache.touch()
+                    if not self.channels_by_category:
+                        # Validators survived but the parsed data did not
+                        self._load_cached()
+                elif r.status_code == 200:
+                    self._stream_playlist(r, on_progress, on_chunk)
+                else:
+                    print("Failed to fetch channels")
                 
         except Exception as e:
             print(f"Error fetching channels: {e}")
@@ -42,103 +131,291 @@ class ChannelManager:
             if on_complete:
                 on_complete()
 
+    def _stream_playlist(self, r, on_progress, on_chunk):
+        """
+        Parses the playlist while it downloads.
+        With nothing on screen yet the partial dict is published immediately,
+        otherwise the old data stays in place until the new list is complete.
+        """
+        total = int(r.headers.get('Content-Length') or 0)
+        raw_lines = []
+        
+        def lines():
+            for raw in r.iter_lines(chunk_size=64 * 1024):
+                line = raw.decode('utf-8', 'replace')
+                raw_lines.append(line)
+                yield line
+                
+        live = not self.channels_by_category
+        channels_by_category = {}
+        channels_by_url = {}
+        # Only a list that is searchable while it loads needs its index kept up to date
+        index = ChannelIndex() if live else None
+        if live:
+            with self._index_lock:
+                self.channels_by_category = channels_by_category
+                self.channels_by_url = channels_by_url
+                self.index = index
+            
+        for chunk in iter_m3u_chunks(lines()):
+            added = [ch for ch in chunk if self._insert(channels_by_category, channels_by_url, ch)]
+            if index is not None: index.add(added)
+                
+            if on_progress: on_progress(r.raw.tell(), total, "Downloading List...")
+            if live and on_chunk: on_chunk(added)
+            
+        text = "\n".join(raw_lines)
+        etag, modified = r.headers.get('ETag'), r.headers.get('Last-Modified')
+        if not live and self.playlist_cache.matches(text):
+            # Server ignored the validators but the list is identical
+            self.playlist_cache.touch(etag, modified)
+            return
+            
+        self._publish(channels_by_category, channels_by_url, index)
+        self.playlist_cache.store(text, etag, modified)
+        self._save_snapshot()
+
+    def _load_cached(self):
+        """
+        Loads the on-disk playlist, preferring the pre-parsed snapshot.
+        Returns True if any channels were loaded.
+        """
+        groups = self.playlist_cache.load_snapshot()
+        if groups is not None:
+            channels_by_category, channels_by_url = {}, {}
+            for rows in groups.values():
+                for row in rows:
+                    self._insert(channels_by_category, channels_by_url, Channel.from_row(row))
+            self._publish(channels_by_category, channels_by_url)
+        else:
+            cached = self.playlist_cache.load()
+            if not cached:
+                return False
+            self._parse_m3u(cached)
+            self._save_snapshot()
+            
+        return bool(self.channels_by_category)
+        
+    @staticmethod
+    def _insert(channels_by_category, channels_by_url, ch):
+        """
+        Adds ch to both lookups. Returns False for a duplicate url within its group.
+        """
+        group = channels_by_category.get(ch.group)
+        if group is None:
+            group = channels_by_category[ch.group] = {}
+        elif ch.url in group:
+            return False
+        group[ch.url] = ch
+        entries = channels_by_url.get(ch.url)
+        if entries is None:
+            channels_by_url[ch.url] = [ch]
+        else:
+            entries.append(ch)
+        return True
+        
+    def _publish(self, channels_by_category, channels_by_url, index=None):
+        """
+        Swaps in a complete channel set together with its lookups.
+        Without a ready index the search index is built on the first query,
+        so loading never waits for it.
+        """
+        with self._index_lock:
+            self.channels_by_category = channels_by_category
+            self.channels_by_url = channels_by_url
+            self.index = index
+            self.revision += 1
+            
+    def _search_index(self):
+        with self._index_lock:
+            if self.index is None:
+                self.index = ChannelIndex(ch for chans in self.channels_by_category.values() for ch in chans.values())
+            return self.index
+        
+    def _save_snapshot(self):
+        groups = {
+            g: [c.to_row() for c in chans.values()]
+            for g, chans in self.channels_by_category.items()
+        }
+        self.playlist_cache.save_snapshot(groups)
+
+    def _stream_headers(self, url):
+        # Header hints (#EXTVLCOPT etc.) from the loaded channel, if any
+        ch = self.find_channel(url)
+        headers = {}
+        if ch and ch.user_agent: headers['User-Agent'] = ch.user_agent
+        if ch and ch.referer: headers['Referer'] = ch.referer
+        return headers
+
+    def probe_stream(self, url, use_cache=True):
+        """
+        Full check of one stream, returns a ProbeResult (latency, variants, resolution...).
+        A result still inside its TTL is returned from the health store instead.
+        Runs in the interactive lane, so it never waits behind a bulk verification.
+        """
+        if use_cache:
+            cached = self.health.get_fresh(url)
+            if cached: return cached
+        result = self.prober.probe_sync(url, self._stream_headers(url) or None, interactive=True)
+        if not result.skipped: self.health.put(result)
+        return result
+        
+    def known_offline(self, urls):
+        """
+        Subset of urls whose last probe (of any age) failed.
+        """
+        last = self.health.get_many(urls, fresh_only=False)
+        return {url for url, result in last.items() if not result.ok}
+        
     def verify_stream_url(self, url):
-        try:
-            # Try HEAD first
-            try:
-                r = self.session.head(url, timeout=2.5, allow_redirects=True)
-                if r.status_code < 400: return True
-            except:
-                pass
+        return self.probe_stream(url).ok
+        
+    def verify_urls(self, urls, callback=None, use_cache=True, headers=None):
+        """
+        Probes many urls concurrently. callback(done, total) after each one.
+        Urls with a fresh result in the health store are not probed again.
+        headers: optional {url: {header: value}} for urls that are not in the
+        loaded playlist (favorites from the scanner...).
+        Returns {url: ProbeResult}.
+        """
+        urls = list(dict.fromkeys(urls))
+        total = len(urls)
+        results = self.health.get_many(urls) if use_cache else {}
+        done = [len(results)]
+        if callback and results: callback(done[0], total)
+        
+        def on_result(url, result):
+            done[0] += 1
+            if callback: callback(done[0], total)
             
-            # Try GET with context manager to auto-close
-            try:
-                with self.session.get(url, timeout=3.5, stream=True) as r:
-                    if r.status_code < 400:
-                        return True
-            except:
-                pass
-        except:
-            pass
-        return False
+        headers = headers or {}
+        items = [(u, u, self._stream_headers(u) or headers.get(u) or None) for u in urls if u not in results]
+        if items:
+            fresh = self.prober.probe_many_sync(items, on_result)
+            # Breaker verdicts are inferred, only real probes are remembered
+            self.health.put_many(r for r in fresh.values() if not r.skipped)
+            results.update(fresh)
+        return results
         
     def remove_channel(self, url, group=None):
-        # Remove from memory
+        """
+        Removes url from memory, from one group if given, else from every group.
+        """
+        entries = self.channels_by_url.get(url)
+        if not entries: return False
+        
         found = False
-        # If group known, faster
-        if group and group in self.channels_by_category:
-             self.channels_by_category[group] = [c for c in self.channels_by_category[group] if c['url'] != url]
-             return True
-             
-        # Else search all (slower)
-        for g in self.channels_by_category:
-            before = len(self.channels_by_category[g])
-            self.channels_by_category[g] = [c for c in self.channels_by_category[g] if c['url'] != url]
-            if len(self.channels_by_category[g]) < before:
-                found = True
+        for ch in list(entries):
+            if group and ch.group != group: continue
+            self._remove(ch)
+            found = True
         return found
         
+    def _remove(self, ch):
+        # Under the index lock so a lazy index build never iterates a shrinking group
+        with self._index_lock:
+            group = self.channels_by_category.get(ch.group)
+            if group is not None and group.get(ch.url) is ch:
+                del group[ch.url]
+            entries = self.channels_by_url.get(ch.url)
+            if entries is not None and ch in entries:
+                entries.remove(ch)
+                if not entries: del self.channels_by_url[ch.url]
+            if self.index is not None:
+                self.index.remove(ch)
+        
+    def start_verify_group(self, group_name, on_result=None, on_progress=None, on_done=None):
+        """
+        Starts (or returns the already running) VerifyJob for a category.
+        Dead channels are removed as their verdicts arrive. Several groups can
+        run at once; they share the prober's bulk concurrency budget.
+        """
+        def finished(job):
+            with self._jobs_lock:
+                if self.verify_jobs.get(group_name) is job:
+                    del self.verify_jobs[group_name]
+            if on_done: on_done(job)
+            
+        with self._jobs_lock:
+            job = self.verify_jobs.get(group_name)
+            if job is not None and not job.finished:
+                return job
+            job = VerifyJob(self, group_name, on_result, on_progress, finished)
+            self.verify_jobs[group_name] = job
+        return job.start()
+        
+    def running_jobs(self):
+        """
+        Snapshot of the category verifications that have not finished yet.
+        """
+        with self._jobs_lock:
+            return [j for j in self.verify_jobs.values() if not j.finished]
+        
     def verify_group(self, group_name, callback=None):
+        """
+        Blocking variant. callback(done, total) after each channel.
+        """
         if group_name not in self.channels_by_category: return
+        on_progress = (lambda job: callback(job.done, job.total)) if callback else None
+        self.start_verify_group(group_name, on_progress=on_progress).wait()
         
-        channels = self.channels_by_category[group_name]
-        valid = []
-        total = len(channels)
-        
-        def check(c):
-            if self.verify_stream_url(c['url']):
-                return c
-            return None
-            
-        with concurrent.futures.ThreadPoolExecutor(max_workers=20) as exc:
-            futures = [exc.submit(check, c) for c in channels]
-            done = 0
-            for f in concurrent.futures.as_completed(futures):
-                res = f.result()
-                if res: valid.append(res)
-                done += 1
-                if callback: callback(done, total)
-                
-        self.channels_by_category[group_name] = valid
+    def _rank_group(self, group_name, results):
+        # Best resolution / bandwidth / latency first; unknown channels keep their place at the end.
+        # Under the index lock so a concurrent remove is not undone by the swap
+        with self._index_lock:
+            group = self.channels_by_category.get(group_name)
+            if not group: return
+            known = [c for c in group.values() if c.url in results]
+            ranked = sorted(known, key=lambda c: results[c.url].rank_key())
+            ranked += [c for c in group.values() if c.url not in results]
+            self.channels_by_category[group_name] = {c.url: c for c in ranked}
 
     def _parse_m3u(self, content):
-        lines = content.split('\n')
-        current_group = "Uncategorized"
-        self.channels_by_category = {}
-        self.current_title = "Unknown"
-        
-        for line in lines:
-            line = line.strip()
-            if not line: continue
-                
-            if line.startswith("#EXTINF"):
-                info = line.split(",", 1)
-                self.current_title = info[1] if len(info) > 1 else "Unknown"
+        # Build into fresh lookups and swap at the end so readers never see half a list
+        channels_by_category, channels_by_url = {}, {}
+        for ch in iter_m3u(content.split('\n')):
+            self._insert(channels_by_category, channels_by_url, ch)
                 
-                if 'group-title="' in line:
-                    start = line.find('group-title="') + 13
-                    end = line.find('"', start)
-                    current_group = line[start:end]
-                else:
-                    current_group = "Others"
-                    
-            elif not line.startswith("#"):
-                url = line
-                if current_group not in self.channels_by_category:
-                    self.channels_by_category[current_group] = []
-                    
-                self.channels_by_category[current_group].append({
-                    'name': self.current_title,
-                    'url': url
-                })
+        self._publish(channels_by_category, channels_by_url)
 
-    def search_channels(self, query):
-        results = []
-        query = query.lower()
-        for group, channels in self.channels_by_category.items():
-            for ch in channels:
-                if query in ch['name'].lower() or query in group.lower():
-                    res = ch.copy()
-                    res['group'] = group
-                    results.append(res)
+    def channels_in(self, group):
+        """
+        Channels of one group (country) in playlist order.
+        """
+        return list(self.channels_by_category.get(group, {}).values())
+
+    def has_channel(self, url):
+        return url in self.channels_by_url
+
+    def find_channel(self, url, group=None):
+        """
+        Returns the loaded Channel for url (with its header hints), or None.
+        """
+        entries = self.channels_by_url.get(url)
+        if not entries: return None
+        if group:
+            for ch in entries:
+                if ch.group == group: return ch
+        return entries[0]
+
+    def search_channels(self, query, limit=None, fuzzy=True):
+        """
+        Ranked search over channel names and countries (see ChannelIndex.search).
+        When the literal search finds little, typo tolerant matches are appended.
+        """
+        # A pasted stream url resolves straight through the url index
+        entries = self.channels_by_url.get(query.strip())
+        if entries:
+            return list(entries)
+            
+        index = self._search_index()
+        results = index.search(query, limit)
+        if fuzzy and len(results) < FUZZY_MIN_RESULTS:
+            seen = set(map(id, results))
+            want = FUZZY_LIMIT if limit is None else min(FUZZY_LIMIT, limit - len(results))
+            if want > 0:
+                for ch in index.fuzzy_search(query, want + len(results)):
+                    if len(results) - len(seen) >= want: break
+                    if id(ch) in seen: continue
+                    results.append(ch)
         return results
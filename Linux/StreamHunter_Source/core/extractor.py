@@ -1,112 +1,308 @@
+import asyncio
+import re
 import threading
-from playwright.sync_api import sync_playwright
 import time
 
-class StreamExtractor:
+from core.browser_pool import BrowserPool
+from core.resource_filter import ResourceFilter
+
+# Pages scanned at the same time by extract_many (one browser context each)
+MAX_PARALLEL = 4
+
+# How often a page's completion is re-evaluated
+POLL_INTERVAL = 0.25
+
+# Response sniffing: only these content types are read, and only bodies up to MAX_SNIFF_BODY
+SNIFF_TYPES = ('mpegurl', 'dash+xml', 'json', 'text/plain', 'octet-stream', 'binary/')
+# Push streams that never end, whatever else their content type says
+STREAMING_TYPES = ('event-stream', 'ndjson', 'json-seq', 'stream+json')
+SNIFF_BYTES = 4096
+MAX_SNIFF_BODY = 512 * 1024
+# Bodies without a Content-Length (chunked, HTTP/2) get this long to arrive
+SNIFF_TIMEOUT = 3.0
+
+# Playlist / manifest URLs inside JSON (slashes may be escaped as \/)
+_STREAM_URL = re.compile(r'https?:(?:\\?/){2}[^\s"\'<>]+?\.(?:m3u8|mpd)(?:\?[^\s"\'<>]*)?', re.IGNORECASE)
+
+def sniff_body(content_type, body):
+    """
+    Looks at the start of a response body. Returns a list of (kind, url)
+    where url None means the response itself is the playlist / manifest.
+    """
+    head = body[:SNIFF_BYTES].lstrip(b'\xef\xbb\xbf \t\r\n')
+    if head.startswith(b'#EXTM3U'):
+        return [('hls', None)]
+    if b'<MPD' in head:
+        return [('dash', None)]
+    if 'json' in content_type or head[:1] in (b'{', b'['):
+        text = body.decode('utf-8', errors='replace')
+        found = []
+        for match in _STREAM_URL.finditer(text):
+            url = match.group(0).replace('\\/', '/').replace('\\u0026', '&')
+            found.append(('dash' if '.mpd' in url.lower() else 'hls', url))
+        return found
+    return []
+
+class ScanPolicy:
+    """
+    When a page scan is finished, instead of always watching it for 15s:
+    - quiet_after_hit seconds after the last stream was found,
+    - or, with nothing found, once the network has been idle for idle_after
+      seconds and no media is loading (never before min_wait); like
+      Playwright's "networkidle2", a couple of long-polling requests may stay open,
+    - and in any case after max_wait seconds.
+    Times are measured from the end of navigation.
+    """
+    def __init__(self, quiet_after_hit=2.5, idle_after=2.0, min_wait=2.0, max_wait=15.0, idle_requests=2):
+        self.quiet_after_hit = quiet_after_hit
+        self.idle_requests = idle_requests
+        self.idle_after = idle_after
+        self.min_wait = min_wait
+        self.max_wait = max_wait
+
+    def finished(self, activity, now=None):
+        """
+        Returns the reason the scan can stop ("quiet", "idle", "cap") or None.
+        """
+        now = now or time.monotonic()
+        elapsed = now - activity.started
+        if elapsed >= self.max_wait:
+            return "cap"
+        if activity.last_hit and now - activity.last_hit >= self.quiet_after_hit:
+            return "quiet"
+        if (not activity.last_hit and elapsed >= self.min_wait and activity.in_flight <= self.idle_requests
+                and now - activity.last_network >= self.idle_after
+                and now - activity.last_media >= self.idle_after):
+            return "idle"
+        return None
+
+class PageActivity:
+    """
+    Network bookkeeping of one page, fed by Playwright request events.
+    """
+    # Requests that mean a player is fetching media (a playlist may follow)
+    MEDIA_TYPES = ('media',)
+    MEDIA_HINTS = ('.ts', '.m4s', '.aac', '.mp4', '.m4a', '.mpd')
+
     def __init__(self):
+        now = time.monotonic()
+        self.started = now
+        self.last_network = now
+        self.last_media = 0
+        self.last_hit = 0
+        self.in_flight = 0
+
+    def restart(self):
+        # The clock starts when navigation is done
+        self.started = self.last_network = time.monotonic()
+
+    def on_request(self, request):
+        self.in_flight += 1
+        self.last_network = time.monotonic()
+        path = request.url.split('?', 1)[0].lower()
+        if request.resource_type in self.MEDIA_TYPES or path.endswith(self.MEDIA_HINTS):
+            self.last_media = self.last_network
+
+    def on_request_done(self, request):
+        self.in_flight = max(0, self.in_flight - 1)
+        self.last_network = time.monotonic()
+
+    def on_hit(self):
+        self.last_hit = time.monotonic()
+
+def parse_url_list(text):
+    """
+    URLs from pasted text or a file: one per line (or separated by spaces /
+    commas), '#' comments skipped, scheme added when missing, duplicates dropped.
+    """
+    urls = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'): continue
+        for url in line.replace(',', ' ').split():
+            if not url.startswith("http"): url = "https://" + url
+            urls.append(url)
+    return list(dict.fromkeys(urls))
+
+class StreamExtractor:
+    def __init__(self, pool=None, policy=None, resource_filter=None):
         self.found_streams = []
+        self.policy = policy or ScanPolicy()
+        # Images, fonts, segments and ads are aborted (scan_rules.json adjusts per site)
+        self.resource_filter = resource_filter or ResourceFilter.load()
+        self._seen = set()
         self._stop_event = threading.Event()
         self._is_running = False
+        # Shared, long-lived browser; scans only pay for a new context
+        self.pool = pool or BrowserPool()
+
+    def warm(self):
+        # Launch the browser ahead of the first scan
+        return self.pool.warm()
+
+    def close(self):
+        self.pool.close()
+
+    @property
+    def is_running(self):
+        return self._is_running
 
     def extract(self, url, on_stream_found_callback=None, on_finish_callback=None):
         """
-        Extracts m3u8 streams from the URL in a separate thread.
+        Extracts m3u8 streams from the URL on the browser pool's loop thread.
         on_stream_found_callback: function(stream_url)
         on_finish_callback: function() called when extraction loop finishes
         """
+        found = None
+        if on_stream_found_callback:
+            found = lambda source_url, stream_info: on_stream_found_callback(stream_info)
+        return self.extract_many([url], found, None, on_finish_callback)
+
+    def extract_many(self, urls, on_stream_found=None, on_url_done=None, on_finish=None, max_parallel=MAX_PARALLEL):
+        """
+        Scans many pages, at most max_parallel at once (each in its own browser context).
+        on_stream_found: function(source_url, stream_info) for every new stream
+        on_url_done: function(source_url, streams) when a page is finished
+        on_finish: function() once the whole batch is done (or stopped)
+        Callbacks run on the browser pool's loop thread.
+        Returns False if a scan is already running.
+        """
         if self._is_running:
-            return
-            
+            return False
+
         self.found_streams = []
+        self._seen = set()
         self._stop_event.clear()
         self._is_running = True
-        
-        def run():
-            try:
-                with sync_playwright() as p:
-                    # Launch with some args to bypass simple bot detection
-                    browser = p.chromium.launch(
-                        headless=True,
-                        args=[
-                            '--disable-blink-features=AutomationControlled',
-                            '--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/110.0.0.0 Safari/537.36'
-                        ]
-                    )
-                    
-                    context = browser.new_context(
-                        user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/110.0.0.0 Safari/537.36',
-                        viewport={'width': 1280, 'height': 720}
-                    )
-                    
-                    page = context.new_page()
-                    
-                    def handle_request(request):
-                        try:
-                            url = request.url
-                            # Check for m3u8 extension or content type
-                            # Added .m3u support
-                            is_stream = False
-                            if ".m3u8" in url or ".m3u" in url:
-                                is_stream = True
-                            elif "application/vnd.apple.mpegurl" in request.headers.get("content-type", ""):
-                                is_stream = True
-                            elif "audio/mpegurl" in request.headers.get("content-type", ""):
-                                is_stream = True
-
-                            if is_stream:
-                                # Avoid duplicates (check by URL only)
-                                if not any(s['url'] == url for s in self.found_streams):
-                                    headers = request.all_headers()
-                                    
-                                    # Only send headers if they look 'real' or non-standard. 
-                                    # Some m3u links fail if we pass the bot-like Playwright UA.
-                                    ua = headers.get('user-agent', '')
-                                    ref = headers.get('referer', '')
-                                    
-                                    stream_info = {
-                                        'url': url,
-                                        'user_agent': ua,
-                                        'referer': ref
-                                    }
-                                    
-                                    self.found_streams.append(stream_info)
-                                    if on_stream_found_callback:
-                                        on_stream_found_callback(stream_info)
-                        except Exception as e:
-                            print(f"Error handling request: {e}")
-
-                    page.on("request", handle_request)
-                    
+        self.pool.submit(self._run_batch(list(urls), on_stream_found, on_url_done, on_finish, max_parallel))
+        return True
+
+    async def _run_batch(self, urls, on_stream_found, on_url_done, on_finish, max_parallel):
+        slots = asyncio.Semaphore(max(1, max_parallel))
+
+        async def one(url):
+            async with slots:
+                if self._stop_event.is_set(): return
+                streams = await self._scan(url, on_stream_found)
+            if on_url_done:
+                try:
+                    on_url_done(url, streams)
+                except Exception as e:
+                    print(f"Scan callback error: {e}")
+
+        try:
+            await asyncio.gather(*(one(url) for url in urls))
+        except Exception as e:
+            print(f"Batch scan error: {e}")
+        finally:
+            self._is_running = False
+            if on_finish:
+                on_finish()
+
+    async def _scan(self, url, on_stream_found):
+        """
+        Scans one page, returns the streams first seen on it.
+        """
+        source_url = url
+        streams = []
+        activity = PageActivity()
+        try:
+            async with self.pool.context() as context:
+                if self.resource_filter:
+                    await self.resource_filter.install(context, url)
+                page = await context.new_page()
+
+                def report(url, headers, kind):
+                    # Avoid duplicates (check by URL only, across the whole batch)
+                    if url in self._seen: return
+                    self._seen.add(url)
+
+                    # Only send headers if they look 'real' or non-standard.
+                    # Some m3u links fail if we pass the bot-like Playwright UA.
+                    ua = headers.get('user-agent', '')
+                    ref = headers.get('referer', '')
+
+                    stream_info = {
+                        'url': url,
+                        'user_agent': ua,
+                        'referer': ref,
+                        'source': source_url,
+                        'kind': kind
+                    }
+
+                    self.found_streams.append(stream_info)
+                    streams.append(stream_info)
+                    activity.on_hit()
+                    if on_stream_found:
+                        on_stream_found(source_url, stream_info)
+
+                def handle_request(request):
                     try:
-                        print(f"Navigating to {url}...")
-                        page.goto(url, timeout=30000, wait_until="domcontentloaded")
-                        
-                        # Simulate some user interaction
-                        page.mouse.move(100, 100)
-                        page.evaluate("window.scrollTo(0, document.body.scrollHeight/2)")
-                        
-                        # Wait loop
-                        for _ in range(15): # Monitor for 15 seconds
-                            if self._stop_event.is_set():
-                                break
-                            time.sleep(1)
-                            
+                        url = request.url
+                        # Check for m3u8 extension or content type
+                        # Added .m3u support
+                        is_stream = False
+                        if ".m3u8" in url or ".m3u" in url:
+                            is_stream = True
+                        elif "application/vnd.apple.mpegurl" in request.headers.get("content-type", ""):
+                            is_stream = True
+                        elif "audio/mpegurl" in request.headers.get("content-type", ""):
+                            is_stream = True
+
+                        if is_stream:
+                            report(url, request.headers, 'hls')
                     except Exception as e:
-                        print(f"Extraction error: {e}")
-                    finally:
-                        try:
-                            browser.close()
-                        except:
-                            pass
-            except Exception as e:
-                print(f"Playwright error: {e}")
-            finally:
-                self._is_running = False
-                if on_finish_callback:
-                    on_finish_callback()
-
-        thread = threading.Thread(target=run, daemon=True)
-        thread.start()
+                        print(f"Error handling request: {e}")
+
+                async def handle_response(response):
+                    # Playlists behind endpoints like /playlist?id=... and urls inside XHR JSON
+                    try:
+                        if response.url in self._seen or response.status >= 400: return
+                        headers = response.headers
+                        ctype = headers.get('content-type', '').lower()
+                        if not any(t in ctype for t in SNIFF_TYPES): return
+                        if any(t in ctype for t in STREAMING_TYPES): return
+                        size = headers.get('content-length')
+                        if size and size.isdigit() and int(size) > MAX_SNIFF_BODY: return
+                        # An open-ended binary response may be a live video feed, never read those
+                        if not size and ('octet-stream' in ctype or 'binary/' in ctype): return
+                        # A length-less body that does not finish in time is given up on
+                        body = await asyncio.wait_for(response.body(), SNIFF_TIMEOUT)
+                        if len(body) > MAX_SNIFF_BODY: body = body[:MAX_SNIFF_BODY]
+                        for kind, url in sniff_body(ctype, body):
+                            report(url or response.url, response.request.headers, kind)
+                    except Exception:
+                        # Redirects, aborted requests and closed pages have no body
+                        pass
+
+                page.on("request", handle_request)
+                page.on("response", handle_response)
+                page.on("request", activity.on_request)
+                page.on("requestfinished", activity.on_request_done)
+                page.on("requestfailed", activity.on_request_done)
+
+                try:
+                    print(f"Navigating to {url}...")
+                    await page.goto(url, timeout=30000, wait_until="domcontentloaded")
+
+                    # Simulate some user interaction
+                    await page.mouse.move(100, 100)
+                    await page.evaluate("window.scrollTo(0, document.body.scrollHeight/2)")
+
+                    # Watch until the policy says the page has nothing more to give
+                    activity.restart()
+                    while not self._stop_event.is_set():
+                        reason = self.policy.finished(activity)
+                        if reason:
+                            print(f"Finished {source_url} ({reason}, {time.monotonic() - activity.started:.1f}s)")
+                            break
+                        await asyncio.sleep(POLL_INTERVAL)
+
+                except Exception as e:
+                    print(f"Extraction error: {e}")
+        except Exception as e:
+            print(f"Playwright error: {e}")
+        return streams
 
     def stop(self):
         self._stop_event.set()
@@ -0,0 +1,246 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from core.favorites_manager import (FavoritesManager, SORT_ADDED, SORT_HEALTH, SORT_MOST_WATCHED, SORT_RECENT,
+                                    update_health)
+
+# FAVORITES_BACKEND=sqlite|json forces a backend; otherwise an existing .db wins
+BACKEND_ENV = "FAVORITES_BACKEND"
+
+# Favorite fields with their own column; anything else goes into `extra` (JSON)
+FIELDS = ('url', 'name', 'group', 'user_agent', 'referer', 'position', 'added_at',
+          'last_played', 'play_count', 'health_score',
+          'offline', 'fail_count', 'next_check', 'last_check')
+# `group` is a keyword in SQL
+COLUMNS = tuple('grp' if f == 'group' else f for f in FIELDS)
+
+ORDER_BY = {
+    SORT_ADDED: "position",
+    SORT_MOST_WATCHED: "play_count DESC, last_played DESC, position",
+    SORT_RECENT: "last_played IS NULL, last_played DESC, position",
+    SORT_HEALTH: "health_score IS NULL, health_score DESC, position",
+}
+
+def open_favorites(json_path="favorites.json", db_path="favorites.db"):
+    """
+    Picks the favorites backend: the FAVORITES_BACKEND environment variable
+    if set, else SQLite when a database already exists, else the JSON file.
+    """
+    backend = os.environ.get(BACKEND_ENV, "").strip().lower()
+    if backend == "sqlite" or (backend != "json" and os.path.exists(db_path)):
+        return FavoritesDB(db_path, migrate_from=json_path)
+    return FavoritesManager(json_path)
+
+class FavoritesDB:
+    """
+    SQLite favorites store with the same public methods as FavoritesManager,
+    plus per-channel history (last played, play count, health score) and a
+    custom order (position). WAL mode lets readers run next to the writer.
+    A favorites.json next to a new database is imported once.
+    """
+    def __init__(self, path="favorites.db", migrate_from=None):
+        self.path = path
+        self._lock = threading.RLock()
+
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS channels (
+                    url TEXT PRIMARY KEY,
+                    name TEXT,
+                    grp TEXT,
+                    user_agent TEXT,
+                    referer TEXT,
+                    position INTEGER NOT NULL,
+                    added_at REAL,
+                    last_played REAL,
+                    play_count INTEGER NOT NULL DEFAULT 0,
+                    health_score REAL,
+                    offline INTEGER NOT NULL DEFAULT 0,
+                    fail_count INTEGER NOT NULL DEFAULT 0,
+                    next_check REAL NOT NULL DEFAULT 0,
+                    last_check REAL,
+                    extra TEXT
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS channels_position ON channels (position)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS channels_plays ON channels (play_count DESC, last_played DESC)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS channels_next_check ON channels (next_check)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS countries (name TEXT PRIMARY KEY, position INTEGER NOT NULL)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+        if migrate_from:
+            self._migrate(migrate_from)
+
+    # --- Migration ---
+    def _migrate(self, json_path):
+        with self._lock:
+            done = self.conn.execute("SELECT value FROM meta WHERE key = 'migrated_from'").fetchone()
+        if done or not os.path.exists(json_path):
+            return
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"Favorites migration skipped: {e}")
+            return
+        with self._lock, self.conn:
+            for ch in data.get("channels", []):
+                if ch.get('url'): self._insert_channel(ch)
+            for name in data.get("countries", []):
+                self._insert_country(name)
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_from', ?)", (json_path,))
+        # Keep the old file around, but out of the way of open_favorites()
+        try:
+            os.replace(json_path, json_path + ".migrated")
+        except OSError as e:
+            print(f"Could not rename {json_path}: {e}")
+
+    # --- Row mapping ---
+    def _to_row(self, ch):
+        values = [ch.get(f) for f in FIELDS]
+        for i, f in enumerate(FIELDS):
+            if f in ('play_count', 'fail_count', 'next_check') and values[i] is None:
+                values[i] = 0
+            elif f == 'offline':
+                values[i] = int(bool(values[i]))
+        extra = {k: v for k, v in ch.items() if k not in FIELDS}
+        return values + [json.dumps(extra) if extra else None]
+
+    def _from_row(self, row):
+        ch = {}
+        for f, value in zip(FIELDS, row):
+            if value is None: continue
+            ch[f] = bool(value) if f == 'offline' else value
+        if row[-1]:
+            try:
+                ch.update(json.loads(row[-1]))
+            except ValueError:
+                pass
+        return ch
+
+    def _select(self, where="", params=(), order=SORT_ADDED):
+        sql = f"SELECT {', '.join(COLUMNS)}, extra FROM channels {where} ORDER BY {ORDER_BY.get(order, 'position')}"
+        with self._lock:
+            return [self._from_row(r) for r in self.conn.execute(sql, params)]
+
+    def _next_position(self, table):
+        row = self.conn.execute(f"SELECT COALESCE(MAX(position), -1) + 1 FROM {table}").fetchone()
+        return row[0]
+
+    def _insert_channel(self, ch):
+        ch = dict(ch)
+        ch.setdefault('position', self._next_position("channels"))
+        ch.setdefault('added_at', time.time())
+        cols = COLUMNS + ('extra',)
+        self.conn.execute(
+            f"INSERT OR IGNORE INTO channels ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})",
+            self._to_row(ch)
+        )
+
+    def _insert_country(self, name):
+        self.conn.execute("INSERT OR IGNORE INTO countries (name, position) VALUES (?, ?)",
+                          (name, self._next_position("countries")))
+
+    # --- FavoritesManager API ---
+    @property
+    def favorites(self):
+        return {"channels": self.channels(), "countries": self.countries()}
+
+    def channels(self, sort=SORT_ADDED):
+        return self._select(order=sort)
+
+    def countries(self):
+        with self._lock:
+            return [r[0] for r in self.conn.execute("SELECT name FROM countries ORDER BY position")]
+
+    def get_channel(self, url):
+        rows = self._select("WHERE url = ?", (url,))
+        return rows[0] if rows else None
+
+    def channel_urls(self):
+        with self._lock:
+            return {r[0] for r in self.conn.execute("SELECT url FROM channels")}
+
+    def add_channel(self, channel_info):
+        with self._lock, self.conn:
+            self._insert_channel(channel_info)
+
+    def remove_channel(self, url):
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM channels WHERE url = ?", (url,))
+
+    def move_channel(self, url, index):
+        """
+        Moves a favorite to position index of the custom order; positions are renumbered.
+        """
+        with self._lock, self.conn:
+            urls = [r[0] for r in self.conn.execute("SELECT url FROM channels ORDER BY position")]
+            if url not in urls: return False
+            urls.remove(url)
+            urls.insert(max(0, min(index, len(urls))), url)
+            self.conn.executemany("UPDATE channels SET position = ? WHERE url = ?", ((i, u) for i, u in enumerate(urls)))
+            return True
+
+    def add_country(self, country_name):
+        with self._lock, self.conn:
+            self._insert_country(country_name)
+
+    def remove_country(self, country_name):
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM countries WHERE name = ?", (country_name,))
+
+    def due_channels(self, now=None):
+        return self._select("WHERE next_check <= ?", (now or time.time(),))
+
+    def apply_results(self, results, now=None):
+        """
+        Same semantics as FavoritesManager.apply_results, one transaction.
+        """
+        now = now or time.time()
+        online = offline = 0
+        with self._lock, self.conn:
+            for url, result in results.items():
+                ch = self.get_channel(url)
+                if ch is None: continue
+                update_health(ch, bool(result), now)
+                self.conn.execute(
+                    "UPDATE channels SET last_check = ?, health_score = ?, offline = ?, fail_count = ?, "
+                    "next_check = ? WHERE url = ?",
+                    (now, ch['health_score'], int(ch['offline']), ch['fail_count'], ch['next_check'], url)
+                )
+                if result: online += 1
+                else: offline += 1
+        return online, offline
+
+    def record_play(self, url, now=None):
+        with self._lock, self.conn:
+            self.conn.execute("UPDATE channels SET play_count = play_count + 1, last_played = ? WHERE url = ?",
+                              (now or time.time(), url))
+
+    def is_channel_fav(self, url):
+        with self._lock:
+            return self.conn.execute("SELECT 1 FROM channels WHERE url = ?", (url,)).fetchone() is not None
+
+    def is_country_fav(self, name):
+        with self._lock:
+            return self.conn.execute("SELECT 1 FROM countries WHERE name = ?", (name,)).fetchone() is not None
+
+    def save_favorites(self):
+        # Every change is committed as it happens
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
@@ -0,0 +1,115 @@
+import os
+import sqlite3
+import threading
+import time
+
+from core.prober import ProbeResult
+
+# How long a probe outcome is trusted before the stream is checked again
+DEFAULT_TTL_OK = 6 * 3600
+DEFAULT_TTL_FAIL = 30 * 60
+
+# Rows nobody asked about for this long are dropped on startup
+MAX_AGE = 14 * 24 * 3600
+
+COLUMNS = ('url', 'checked_at', 'ok', 'status', 'latency', 'reason', 'kind',
+           'variants', 'max_bandwidth', 'max_resolution')
+
+# SQLite's default limit on bound parameters per statement
+_BATCH = 900
+
+class HealthStore:
+    """
+    Persistent cache of stream probe outcomes (SQLite).
+    Positive and negative results get their own TTL so dead streams are
+    retried sooner than live ones are re-confirmed.
+    """
+    def __init__(self, path=os.path.join("cache", "health.db"), ttl_ok=DEFAULT_TTL_OK, ttl_fail=DEFAULT_TTL_FAIL):
+        self.path = path
+        self.ttl_ok = ttl_ok
+        self.ttl_fail = ttl_fail
+        self._lock = threading.Lock()
+
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS probes (
+                    url TEXT PRIMARY KEY,
+                    checked_at REAL NOT NULL,
+                    ok INTEGER NOT NULL,
+                    status INTEGER,
+                    latency REAL,
+                    reason TEXT,
+                    kind TEXT,
+                    variants INTEGER,
+                    max_bandwidth INTEGER,
+                    max_resolution TEXT
+                )
+            """)
+            self.conn.execute("DELETE FROM probes WHERE checked_at < ?", (time.time() - MAX_AGE,))
+
+    def _from_row(self, row):
+        url, checked_at, ok, status, latency, reason, kind, variants, bandwidth, resolution = row
+        return ProbeResult(url, bool(ok), status, latency, reason or "", kind,
+                           variants or 0, bandwidth or 0, resolution, checked_at)
+
+    def is_fresh(self, result, now=None):
+        now = now or time.time()
+        ttl = self.ttl_ok if result.ok else self.ttl_fail
+        return now - result.checked_at < ttl
+
+    def get(self, url):
+        """
+        Last known result for url regardless of age, or None.
+        """
+        with self._lock:
+            row = self.conn.execute(f"SELECT {', '.join(COLUMNS)} FROM probes WHERE url = ?", (url,)).fetchone()
+        return self._from_row(row) if row else None
+
+    def get_fresh(self, url):
+        result = self.get(url)
+        return result if result and self.is_fresh(result) else None
+
+    def get_many(self, urls, fresh_only=True):
+        """
+        {url: ProbeResult} for the urls we have (fresh) results for.
+        """
+        urls = list(urls)
+        found = {}
+        now = time.time()
+        with self._lock:
+            for i in range(0, len(urls), _BATCH):
+                batch = urls[i:i + _BATCH]
+                marks = ",".join("?" * len(batch))
+                rows = self.conn.execute(f"SELECT {', '.join(COLUMNS)} FROM probes WHERE url IN ({marks})", batch)
+                for row in rows:
+                    result = self._from_row(row)
+                    if not fresh_only or self.is_fresh(result, now):
+                        found[result.url] = result
+        return found
+
+    def put(self, result):
+        self.put_many([result])
+
+    def put_many(self, results):
+        rows = [
+            (r.url, r.checked_at, int(r.ok), r.status, r.latency, r.reason, r.kind,
+             r.variants, r.max_bandwidth, r.max_resolution)
+            for r in results
+        ]
+        if not rows: return
+        try:
+            with self._lock, self.conn:
+                self.conn.executemany(
+                    f"INSERT OR REPLACE INTO probes ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                    rows
+                )
+        except Exception as e:
+            print(f"Error saving probe results: {e}")
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
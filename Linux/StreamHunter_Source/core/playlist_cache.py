@@ -0,0 +1,126 @@
+import hashlib
+import json
+import os
+import pickle
+import time
+
+# Bump whenever the layout of the parsed snapshot changes
+SNAPSHOT_VERSION = 2
+
+class PlaylistCache:
+    """
+    Disk cache for the raw iptv-org playlist plus the validators
+    (ETag / Last-Modified) needed for conditional refreshes.
+    """
+    def __init__(self, cache_dir="cache", name="index.country"):
+        self.cache_dir = cache_dir
+        self.playlist_path = os.path.join(cache_dir, f"{name}.m3u")
+        self.meta_path = os.path.join(cache_dir, f"{name}.json")
+        self.snapshot_path = os.path.join(cache_dir, f"{name}.snapshot")
+        self.meta = self._load_meta()
+
+    def _load_meta(self):
+        try:
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except:
+            return {}
+
+    @staticmethod
+    def digest(text):
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    def matches(self, text):
+        """
+        True if text is byte-identical to the cached playlist.
+        """
+        return self.has_playlist() and self.meta.get('sha1') == self.digest(text)
+
+    def has_playlist(self):
+        return os.path.exists(self.playlist_path)
+
+    def load(self):
+        """
+        Returns the cached playlist text, or None if nothing usable is on disk.
+        """
+        if not self.has_playlist():
+            return None
+        try:
+            with open(self.playlist_path, 'r', encoding='utf-8') as f:
+                return f.read()
+        except Exception as e:
+            print(f"Error reading playlist cache: {e}")
+            return None
+
+    def conditional_headers(self):
+        # Only send validators if we still have the body they describe
+        headers = {}
+        if not self.has_playlist():
+            return headers
+        if self.meta.get('etag'):
+            headers['If-None-Match'] = self.meta['etag']
+        if self.meta.get('last_modified'):
+            headers['If-Modified-Since'] = self.meta['last_modified']
+        return headers
+
+    def store(self, text, etag=None, last_modified=None):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._write_atomic(self.playlist_path, text)
+            self.meta = {
+                'etag': etag,
+                'last_modified': last_modified,
+                'sha1': self.digest(text),
+                'fetched_at': time.time()
+            }
+            self._write_atomic(self.meta_path, json.dumps(self.meta))
+        except Exception as e:
+            print(f"Error writing playlist cache: {e}")
+
+    def touch(self, etag=None, last_modified=None):
+        # Body unchanged, just remember when we last confirmed it
+        if etag: self.meta['etag'] = etag
+        if last_modified: self.meta['last_modified'] = last_modified
+        self.meta['fetched_at'] = time.time()
+        try:
+            self._write_atomic(self.meta_path, json.dumps(self.meta))
+        except Exception as e:
+            print(f"Error writing playlist cache: {e}")
+
+    def load_snapshot(self):
+        """
+        Returns the pre-parsed groups for the cached playlist, or None if the
+        snapshot is missing, from another format version or for another source.
+        """
+        source = self.meta.get('sha1')
+        if not source or not os.path.exists(self.snapshot_path):
+            return None
+        try:
+            with open(self.snapshot_path, 'rb') as f:
+                snap = pickle.load(f)
+            if snap.get('version') != SNAPSHOT_VERSION or snap.get('source') != source:
+                return None
+            return snap['groups']
+        except Exception as e:
+            print(f"Discarding channel snapshot: {e}")
+            return None
+
+    def save_snapshot(self, groups):
+        # groups: {group: [Channel row tuple, ...]} for the playlist currently on disk
+        source = self.meta.get('sha1')
+        if not source:
+            return
+        try:
+            snap = {'version': SNAPSHOT_VERSION, 'source': source, 'groups': groups}
+            tmp = self.snapshot_path + ".tmp"
+            with open(tmp, 'wb') as f:
+                pickle.dump(snap, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self.snapshot_path)
+        except Exception as e:
+            print(f"Error writing channel snapshot: {e}")
+
+    def _write_atomic(self, path, text):
+        tmp = path + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp, path)
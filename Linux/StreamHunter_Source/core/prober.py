@@ -0,0 +1,487 @@
+import asyncio
+import threading
+import time
+from urllib.parse import urljoin, urlsplit
+
+import aiohttp
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+# Only the start of a playlist / segment is ever downloaded
+HEAD_BYTES = 16 * 1024
+SEGMENT_BYTES = 1024
+
+# Failure reasons that say the host itself is unreachable (they feed the circuit breaker)
+CONNECT_FAILED = "Connection failed"
+CONNECT_TIMEOUT = "Connect timeout"
+HOST_DOWN = "Host unreachable (skipped)"
+
+# Older aiohttp versions report connect timeouts as plain timeouts
+_ConnectTimeout = getattr(aiohttp, 'ConnectionTimeoutError', ())
+
+class ProbeResult:
+    """
+    Outcome of one stream check. Truthy when the stream looks playable, so
+    callers that only need keep/drop can treat it like a bool.
+    """
+    __slots__ = ('url', 'ok', 'status', 'latency', 'reason', 'kind',
+                 'variants', 'max_bandwidth', 'max_resolution', 'checked_at', 'cached', 'skipped')
+
+    def __init__(self, url, ok=False, status=None, latency=None, reason="", kind=None,
+                 variants=0, max_bandwidth=0, max_resolution=None, checked_at=None):
+        self.url = url
+        self.ok = ok
+        self.status = status
+        self.latency = latency
+        self.reason = reason
+        self.kind = kind
+        self.variants = variants
+        self.max_bandwidth = max_bandwidth
+        self.max_resolution = max_resolution
+        self.checked_at = checked_at if checked_at is not None else time.time()
+        # True when served from the health store instead of the network
+        self.cached = checked_at is not None
+        # True when never sent because the host's circuit breaker was open
+        self.skipped = False
+
+    def __bool__(self):
+        return self.ok
+
+    @property
+    def height(self):
+        return resolution_height(self.max_resolution)
+
+    def rank_key(self):
+        """
+        Sort key, best stream first: playable, then resolution, bandwidth, latency.
+        """
+        return (not self.ok, -self.height, -self.max_bandwidth, self.latency if self.latency is not None else 99)
+
+    def summary(self):
+        if not self.ok:
+            return (self.reason or "offline") + (", cached" if self.cached else "")
+        parts = []
+        if self.height: parts.append(f"{self.height}p")
+        if self.variants > 1: parts.append(f"{self.variants} variants")
+        if self.latency is not None: parts.append(f"{self.latency * 1000:.0f} ms")
+        if self.cached: parts.append("cached")
+        return " • ".join(parts) or "online"
+
+    def __repr__(self):
+        return f"ProbeResult({self.url!r}, ok={self.ok}, reason={self.reason!r})"
+
+def resolution_height(resolution):
+    # '1280x720' -> 720
+    try:
+        return int(resolution.lower().split('x')[1])
+    except (AttributeError, IndexError, ValueError):
+        return 0
+
+def parse_attributes(text):
+    """
+    'BANDWIDTH=800000,RESOLUTION=640x360,CODECS="a,b"' -> dict (quote aware).
+    """
+    attrs = {}
+    key, value, quoted, in_value = [], [], False, False
+    for c in text + ',':
+        if in_value:
+            if c == '"':
+                quoted = not quoted
+            elif c == ',' and not quoted:
+                attrs[''.join(key).strip().upper()] = ''.join(value)
+                key, value, in_value = [], [], False
+            else:
+                value.append(c)
+        elif c == '=':
+            in_value = True
+        elif c != ',':
+            key.append(c)
+    return attrs
+
+def parse_master(text, base_url):
+    """
+    Returns [(bandwidth, resolution, absolute_url), ...] for a master playlist.
+    """
+    variants = []
+    pending = None
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith('#EXT-X-STREAM-INF:'):
+            attrs = parse_attributes(line[len('#EXT-X-STREAM-INF:'):])
+            try:
+                bandwidth = int(attrs.get('BANDWIDTH', 0))
+            except ValueError:
+                bandwidth = 0
+            pending = (bandwidth, attrs.get('RESOLUTION'))
+        elif line and not line.startswith('#') and pending:
+            variants.append((pending[0], pending[1], urljoin(base_url, line)))
+            pending = None
+    return variants
+
+def first_segment(text, base_url):
+    saw_extinf = False
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith('#EXTINF'):
+            saw_extinf = True
+        elif saw_extinf and line and not line.startswith('#'):
+            return urljoin(base_url, line)
+    return None
+
+class RateLimiter:
+    """
+    Token bucket: at most `rate` acquisitions per second, bursts up to `burst`.
+    Only used from the prober's event loop.
+    """
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst or rate)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class HostCircuitBreaker:
+    """
+    Per-host failure tracking. After `threshold` consecutive connect failures
+    a host is considered down for `cooldown` seconds (doubling on repeated
+    trips) and remaining probes for it are answered without network traffic.
+    After the cooldown a single trial probe decides whether it closes again.
+    """
+    def __init__(self, threshold=3, cooldown=60, max_cooldown=30 * 60):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        # host -> [consecutive_failures, open_until, current_cooldown, trial_in_flight]
+        self.hosts = {}
+
+    def allow(self, host):
+        state = self.hosts.get(host)
+        if state is None or state[1] == 0:
+            return True
+        if time.monotonic() < state[1] or state[3]:
+            return False
+        # Half open: let exactly one probe through
+        state[3] = True
+        return True
+
+    def trial_pending(self, host):
+        state = self.hosts.get(host)
+        return bool(state and state[3])
+
+    def release_trial(self, host):
+        # The trial ended without a verdict (timeout, error, cancel): the next probe may try again
+        state = self.hosts.get(host)
+        if state is not None:
+            state[3] = False
+
+    def record_success(self, host):
+        self.hosts.pop(host, None)
+
+    def record_failure(self, host):
+        state = self.hosts.get(host)
+        if state is None:
+            state = self.hosts[host] = [0, 0, self.cooldown, False]
+        state[0] += 1
+        if state[3]:
+            # Trial failed, stay open for longer
+            state[2] = min(state[2] * 2, self.max_cooldown)
+        if state[0] >= self.threshold or state[3]:
+            state[1] = time.monotonic() + state[2]
+        state[3] = False
+
+    def is_open(self, host):
+        state = self.hosts.get(host)
+        return bool(state and state[1] and time.monotonic() < state[1])
+
+    def open_hosts(self):
+        return [h for h in self.hosts if self.is_open(h)]
+
+class ProbeLane:
+    """
+    One independent transport: its own aiohttp connection pool, global slot
+    semaphore, per-host semaphores and rate limit. Probes in one lane never
+    wait on connections or slots held by another.
+    Created and used only on the prober's event loop.
+    """
+    def __init__(self, concurrency, per_host, rate, timeout):
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.slots = asyncio.Semaphore(concurrency)
+        self.limiter = RateLimiter(rate) if rate else None
+        self.host_slots = {}
+        # Pool sized to the lane: every slot can keep its connection alive for reuse
+        connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=per_host,
+                                         ttl_dns_cache=300, keepalive_timeout=30)
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=timeout,
+            headers={'User-Agent': USER_AGENT}
+        )
+
+    def host_slot(self, host):
+        slot = self.host_slots.get(host)
+        if slot is None:
+            slot = self.host_slots[host] = asyncio.Semaphore(self.per_host)
+        return slot
+
+    async def close(self):
+        await self.session.close()
+
+class StreamProber:
+    """
+    Stream health checks on an asyncio loop owned by a background thread.
+    Hundreds of probes can be in flight at once without an OS thread each;
+    per-host semaphores and a global rate limit keep single CDNs from being hammered.
+    Bulk checks (categories, favorites) and interactive ones (a single
+    "test this channel") run in separate lanes, so a user click never
+    queues behind a category test.
+    The public methods are thread safe and return concurrent.futures.Future objects
+    (or block, for the *_sync helpers).
+    """
+    def __init__(self, concurrency=200, per_host=8, rate=100, connect_timeout=2.5, read_timeout=3.5,
+                 check_segment=False, breaker=None, interactive_concurrency=16):
+        self.concurrency = concurrency
+        self.interactive_concurrency = interactive_concurrency
+        self.breaker = breaker
+        self.check_segment = check_segment
+        self.per_host = per_host
+        self.rate = rate
+        self.timeout = aiohttp.ClientTimeout(
+            total=connect_timeout + read_timeout,
+            sock_connect=connect_timeout,
+            sock_read=read_timeout
+        )
+
+        self._loop = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+        # Created lazily on the loop thread
+        self._lanes = {}
+
+    # --- Loop management ---
+    def _ensure_loop(self):
+        with self._start_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="StreamProber", daemon=True)
+                self._thread.start()
+        return self._loop
+
+    def submit(self, coro):
+        """
+        Schedules a coroutine on the prober loop. Cancelling the returned
+        future cancels the coroutine.
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    def close(self):
+        if self._loop is None: return
+        async def _shutdown():
+            for lane in self._lanes.values():
+                await lane.close()
+        try:
+            self.submit(_shutdown()).result(timeout=5)
+        except Exception:
+            pass
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+    def _lane(self, interactive=False):
+        key = 'interactive' if interactive else 'bulk'
+        lane = self._lanes.get(key)
+        if lane is None:
+            if interactive:
+                # Few, latency sensitive requests: no rate limit to wait on
+                lane = ProbeLane(self.interactive_concurrency, 4, None, self.timeout)
+            else:
+                lane = ProbeLane(self.concurrency, self.per_host, self.rate, self.timeout)
+            self._lanes[key] = lane
+        return lane
+
+    # --- Probing ---
+    async def _fetch_head(self, session, url, headers, limit=HEAD_BYTES, extra=None):
+        """
+        GETs at most `limit` bytes. Returns (status, content_type, final_url, body).
+        """
+        if extra:
+            headers = dict(headers or {}, **extra)
+        async with session.get(url, headers=headers, allow_redirects=True) as r:
+            body = b""
+            if r.status < 400:
+                while len(body) < limit:
+                    chunk = await r.content.read(limit - len(body))
+                    if not chunk: break
+                    body += chunk
+            return r.status, r.headers.get('Content-Type', '').lower(), str(r.url), body
+
+    async def _check(self, session, url, headers):
+        """
+        Validates the stream itself, not just the status code: the body must be
+        a real playlist (following one master -> variant level) or media data.
+        """
+        result = ProbeResult(url)
+        started = time.monotonic()
+        try:
+            status, ctype, final_url, body = await self._fetch_head(session, url, headers)
+            result.status = status
+            result.latency = time.monotonic() - started
+            if status >= 400:
+                result.reason = f"HTTP {status}"
+                return result
+
+            text = body.lstrip(b'\xef\xbb\xbf \t\r\n').decode('utf-8', 'replace')
+            if text.startswith('#EXTM3U'):
+                result.kind = 'hls'
+                return await self._check_hls(session, result, text, final_url, headers)
+
+            if '<MPD' in text[:2048]:
+                result.kind = 'dash'
+                result.ok = True
+                return result
+
+            if 'html' in ctype or text[:1] == '<':
+                result.reason = "HTML page instead of a stream"
+                return result
+
+            if ctype.startswith(('video/', 'audio/')) or body[:1] == b'\x47':
+                result.kind = 'media'
+                result.ok = bool(body)
+                result.reason = "" if body else "Empty response"
+                return result
+
+            result.reason = f"Not a stream ({ctype or 'unknown type'})"
+            return result
+
+        except asyncio.CancelledError:
+            raise
+        except _ConnectTimeout:
+            result.reason = CONNECT_TIMEOUT
+        except asyncio.TimeoutError:
+            result.reason = "Timeout"
+        except aiohttp.ClientConnectorError:
+            result.reason = CONNECT_FAILED
+        except Exception as e:
+            result.reason = type(e).__name__
+        return result
+
+    async def _check_hls(self, session, result, text, base_url, headers):
+        variants = parse_master(text, base_url)
+        if '#EXT-X-STREAM-INF' in text:
+            if not variants:
+                result.reason = "Empty master playlist"
+                return result
+            result.variants = len(variants)
+            best = max(variants, key=lambda v: v[0])
+            result.max_bandwidth = best[0]
+            result.max_resolution = max((v[1] for v in variants if v[1]), key=resolution_height, default=None)
+
+            # One level down: the first variant is what players start with
+            status, _, variant_url, body = await self._fetch_head(session, variants[0][2], headers)
+            text = body.lstrip(b'\xef\xbb\xbf \t\r\n').decode('utf-8', 'replace')
+            if status >= 400:
+                result.reason = f"Variant HTTP {status}"
+                return result
+            if not text.startswith('#EXTM3U'):
+                result.reason = "Variant is not a playlist"
+                return result
+            base_url = variant_url
+        else:
+            result.variants = 1
+
+        segment = first_segment(text, base_url)
+        if segment is None:
+            result.reason = "Playlist has no segments"
+            return result
+
+        if self.check_segment:
+            status, ctype, _, body = await self._fetch_head(
+                session, segment, headers, SEGMENT_BYTES, {'Range': f'bytes=0-{SEGMENT_BYTES - 1}'}
+            )
+            if status >= 400 or not body or 'html' in ctype:
+                result.reason = f"Segment unavailable (HTTP {status})"
+                return result
+
+        result.ok = True
+        return result
+
+    async def probe(self, url, headers=None, interactive=False):
+        """
+        Returns a ProbeResult. Waits for a per-host slot, then a global slot
+        and a rate limit token of its lane before touching the network.
+        Queueing on a busy host first keeps it from holding global slots idle.
+        Bulk probes of hosts whose circuit breaker is open are answered
+        immediately; interactive ones always go out (and can close it again).
+        """
+        lane = self._lane(interactive)
+        parts = urlsplit(url)
+        host = parts.hostname or ""
+        # Breaker state is per endpoint, one dead port says nothing about the others
+        endpoint = parts.netloc.lower()
+        trial = settled = False
+        try:
+            async with lane.host_slot(host):
+                async with lane.slots:
+                    # Checked after queueing: earlier probes may have just tripped the breaker
+                    if self.breaker and not interactive:
+                        if not self.breaker.allow(endpoint):
+                            result = ProbeResult(url, reason=HOST_DOWN)
+                            result.skipped = True
+                            return result
+                        trial = self.breaker.trial_pending(endpoint)
+                    if lane.limiter:
+                        await lane.limiter.acquire()
+                    result = await self._check(lane.session, url, headers)
+
+            if self.breaker:
+                if result.reason in (CONNECT_FAILED, CONNECT_TIMEOUT):
+                    self.breaker.record_failure(endpoint)
+                    settled = True
+                elif result.status is not None:
+                    self.breaker.record_success(endpoint)
+                    settled = True
+            return result
+        finally:
+            # A half-open trial must never stay in flight, or the host is skipped forever
+            if trial and not settled:
+                self.breaker.release_trial(endpoint)
+
+    async def probe_many(self, items, on_result=None):
+        """
+        items: iterable of (key, url, headers). Calls on_result(key, result) as each
+        probe finishes (from the loop thread). Returns {key: ProbeResult}.
+        Cancelling this coroutine cancels every probe still pending.
+        """
+        async def one(key, url, headers):
+            result = await self.probe(url, headers)
+            if on_result:
+                try:
+                    on_result(key, result)
+                except Exception as e:
+                    print(f"Probe callback error: {e}")
+            return key, result
+
+        tasks = [asyncio.ensure_future(one(*item)) for item in items]
+        try:
+            results = await asyncio.gather(*tasks)
+        except asyncio.CancelledError:
+            for t in tasks: t.cancel()
+            raise
+        return dict(results)
+
+    # --- Blocking helpers for worker threads ---
+    def probe_sync(self, url, headers=None, interactive=False):
+        return self.submit(self.probe(url, headers, interactive)).result()
+
+    def probe_many_sync(self, items, on_result=None):
+        return self.submit(self.probe_many(items, on_result)).result()
@@ -0,0 +1,241 @@
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+
+from core.prober import RateLimiter
+
+# Priority classes, lower is checked first
+FAVORITE, RECENT, EXPANDED, BACKGROUND = range(4)
+
+# How often each class is re-checked; None falls back to the health store TTLs
+REFRESH = {
+    FAVORITE: 15 * 60,
+    RECENT: 30 * 60,
+    EXPANDED: 30 * 60,
+    BACKGROUND: None,
+}
+
+RECENT_MAX = 20
+IDLE_SLEEP = 1.0
+
+class ReverifyScheduler:
+    """
+    Low priority background re-probing that keeps channel liveness fresh.
+    One heap per priority class, ordered by due time: favorites first, then
+    recently played streams, then the categories open in the browser, then
+    everything else. Probes are spent at a fixed rate (default 2/s) and the
+    scheduler steps aside while something is playing or a user started a
+    category test. Results go to the health store and on_result(url, result),
+    which is called from the prober loop thread.
+    """
+    def __init__(self, manager, rate=2.0, max_in_flight=4, on_result=None):
+        self.manager = manager
+        self.rate = rate
+        self.max_in_flight = max_in_flight
+        self.on_result = on_result
+
+        self._lock = threading.Lock()
+        self._queues = [[] for _ in REFRESH]
+        # url -> (priority, seq, due); heap entries with another seq are stale
+        self._entries = {}
+        self._seq = itertools.count()
+        self._revision = None
+
+        self.favorites = {}
+        self.recent = deque(maxlen=RECENT_MAX)
+        self.expanded = set()
+        self._paused = set()
+
+        self._future = None
+        self._stopping = False
+
+    # --- Control (thread safe) ---
+    def start(self):
+        if self._future is None:
+            self._stopping = False
+            self._future = self.manager.prober.submit(self._run())
+        return self
+
+    def stop(self):
+        self._stopping = True
+        if self._future:
+            self._future.cancel()
+            self._future = None
+
+    def set_paused(self, reason, paused=True):
+        """
+        Pauses while any reason is set, e.g. set_paused("playback", player.is_active()).
+        """
+        with self._lock:
+            if paused: self._paused.add(reason)
+            else: self._paused.discard(reason)
+
+    @property
+    def paused(self):
+        return bool(self._paused)
+
+    def set_favorites(self, favorites):
+        """
+        favorites: favorite channel dicts ({'url', 'user_agent', 'referer', ...}).
+        """
+        with self._lock:
+            old = set(self.favorites)
+            self.favorites = {f['url']: f for f in favorites if f.get('url')}
+            self._reprioritize(old | set(self.favorites))
+
+    def update_favorite(self, favorite):
+        """
+        Picks up a favorite's new health state (offline retry backoff).
+        """
+        with self._lock:
+            url = favorite.get('url')
+            if url not in self.favorites: return
+            self.favorites[url] = favorite
+            self._reprioritize([url])
+
+    def note_played(self, url):
+        with self._lock:
+            if url in self.recent: self.recent.remove(url)
+            self.recent.appendleft(url)
+            self._reprioritize([url])
+
+    def set_expanded(self, groups):
+        with self._lock:
+            groups = set(groups)
+            changed = groups ^ self.expanded
+            self.expanded = groups
+            urls = []
+            for group in changed:
+                urls.extend(self.manager.channels_by_category.get(group, ()))
+            self._reprioritize(urls)
+
+    # --- Queue bookkeeping (callers hold the lock) ---
+    def _priority(self, url):
+        if url in self.favorites: return FAVORITE
+        if url in self.recent: return RECENT
+        if self.expanded:
+            for ch in self.manager.channels_by_url.get(url, ()):
+                if ch.group in self.expanded: return EXPANDED
+        return BACKGROUND
+
+    def _interval(self, priority, result):
+        interval = REFRESH[priority]
+        health = self.manager.health
+        ttl = health.ttl_ok if result.ok else health.ttl_fail
+        return ttl if interval is None else min(interval, ttl)
+
+    def _not_before(self, url, due):
+        # An offline favorite is not re-checked before its retry backoff ends
+        favorite = self.favorites.get(url)
+        if favorite is None: return due
+        return max(due, favorite.get('next_check') or 0)
+
+    def _schedule(self, url, due, priority=None):
+        if priority is None: priority = self._priority(url)
+        due = self._not_before(url, due)
+        seq = next(self._seq)
+        self._entries[url] = (priority, seq, due)
+        heapq.heappush(self._queues[priority], (due, seq, url))
+
+    def _reprioritize(self, urls):
+        now = time.time()
+        for url in urls:
+            entry = self._entries.get(url)
+            priority = self._priority(url)
+            if entry is None:
+                # New favorite / played stream that is not part of the catalog
+                if priority != BACKGROUND: self._schedule(url, now, priority)
+            elif entry[0] != priority or entry[2] < self._not_before(url, entry[2]):
+                self._schedule(url, entry[2], priority)
+
+    def _sync_catalog(self):
+        # Picks up channels of a freshly published playlist
+        revision = self.manager.revision
+        if revision == self._revision: return
+        self._revision = revision
+        urls = [u for u in list(self.manager.channels_by_url) if u not in self._entries]
+        known = self.manager.health.get_many(urls, fresh_only=False)
+        now = time.time()
+        with self._lock:
+            for url in urls:
+                if url in self._entries: continue
+                priority = self._priority(url)
+                result = known.get(url)
+                due = result.checked_at + self._interval(priority, result) if result else now
+                self._schedule(url, due, priority)
+
+    def _next(self, now):
+        with self._lock:
+            for queue in self._queues:
+                while queue:
+                    due, seq, url = queue[0]
+                    entry = self._entries.get(url)
+                    if entry is None or entry[1] != seq:
+                        heapq.heappop(queue)
+                        continue
+                    if due > now: break
+                    heapq.heappop(queue)
+                    if url not in self.favorites and url not in self.manager.channels_by_url:
+                        # Channel is gone (removed, or a refresh dropped it)
+                        del self._entries[url]
+                        continue
+                    return url, entry[0]
+        return None, None
+
+    # --- Loop side ---
+    async def _run(self):
+        limiter = RateLimiter(self.rate, burst=1)
+        slots = asyncio.Semaphore(self.max_in_flight)
+        try:
+            while not self._stopping:
+                # Playback and user started tests get the bandwidth
+                if self._paused or self.manager.verify_jobs:
+                    await asyncio.sleep(IDLE_SLEEP)
+                    continue
+
+                self._sync_catalog()
+                now = time.time()
+                url, priority = self._next(now)
+                if url is None:
+                    await asyncio.sleep(IDLE_SLEEP)
+                    continue
+
+                # Checked elsewhere in the meantime (single test, category test...)
+                last = self.manager.health.get(url)
+                if last and now - last.checked_at < self._interval(priority, last):
+                    with self._lock:
+                        self._schedule(url, last.checked_at + self._interval(priority, last), priority)
+                    continue
+
+                await slots.acquire()
+                await limiter.acquire()
+                asyncio.ensure_future(self._probe(url, priority, slots))
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"Background verification stopped: {e}")
+
+    async def _probe(self, url, priority, slots):
+        try:
+            favorite = self.favorites.get(url)
+            headers = self.manager._stream_headers(url)
+            if favorite:
+                if favorite.get('user_agent'): headers.setdefault('User-Agent', favorite['user_agent'])
+                if favorite.get('referer'): headers.setdefault('Referer', favorite['referer'])
+            result = await self.manager.prober.probe(url, headers or None)
+            with self._lock:
+                self._schedule(url, result.checked_at + self._interval(priority, result))
+            # A probe skipped by the circuit breaker is no verdict on the stream
+            if result.skipped: return
+            self.manager.health.put(result)
+            if self.on_result:
+                self.on_result(url, result)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Background probe error: {e}")
+        finally:
+            slots.release()
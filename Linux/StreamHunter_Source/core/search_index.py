@@ -0,0 +1,252 @@
+import bisect
+import heapq
+import threading
+from array import array
+from collections import Counter
+
+# Everything that separates words in channel names
+_SEPARATORS = str.maketrans({c: ' ' for c in '()[]{}.,;:!?/\\|-_+&\'"*#@~'})
+
+# Result ranking, lower is better
+EXACT, PREFIX, TOKEN_PREFIX, SUBSTRING = 0, 1, 2, 3
+
+# Fuzzy search: trigrams shared by more channels than this are too common to help
+MAX_TRIGRAM_POSTING = 4000
+FUZZY_CANDIDATES = 300
+MIN_SIMILARITY = 0.35
+
+def tokenize(text):
+    return text.translate(_SEPARATORS).split()
+
+def trigrams(text):
+    """
+    Word-padded trigrams, e.g. 'bbc one' -> ' bb', 'bbc', 'bc ', ' on', 'one', 'ne '.
+    """
+    grams = set()
+    for word in tokenize(text):
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+class ChannelIndex:
+    """
+    Search index over the loaded channels.
+    Lowercased names are computed once at build time; queries go through a
+    token -> ids inverted index (prefix lookups via a sorted vocabulary) and
+    a single joined blob for plain substring hits. A trigram index over the
+    same names backs typo-tolerant fuzzy_search(); it is only built (and
+    then extended) when a fuzzy search actually runs.
+    Channels are addressed by their position in self.channels; removed
+    channels leave a None behind so ids stay stable.
+    Thread safe: the download thread adds, the verifier removes and the
+    search worker queries the same index.
+    """
+    def __init__(self, channels=()):
+        self.channels = []
+        self.names = []
+        self.tokens = {}
+        self.names_exact = {}
+        self.groups = {}
+        self.ids = {}
+        self.grams = {}
+        self._grams_upto = 0
+        self._group_grams = {}
+
+        self._vocab = None
+        self._blob = None
+        self._offsets = None
+        self._lock = threading.RLock()
+        self.add(channels)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, channels):
+        with self._lock:
+            self._add(channels)
+
+    def _add(self, channels):
+        for ch in channels:
+            cid = len(self.channels)
+            name = ch.name.lower()
+            self.channels.append(ch)
+            self.names.append(name)
+            self.ids[id(ch)] = cid
+
+            self.names_exact.setdefault(name, []).append(cid)
+            self.groups.setdefault(ch.group.lower(), []).append(cid)
+            for tok in set(tokenize(name)):
+                self.tokens.setdefault(tok, []).append(cid)
+
+        # Derived lookups are rebuilt on the next query
+        self._vocab = None
+        self._blob = None
+
+    def remove(self, ch):
+        with self._lock:
+            cid = self.ids.pop(id(ch), None)
+            if cid is None:
+                return False
+            # Postings are skipped lazily, only the slot is cleared
+            self.channels[cid] = None
+            return True
+
+    def prepare(self):
+        with self._lock:
+            self._prepare()
+
+    def _prepare(self):
+        # Cheap to call repeatedly; only rebuilds after add()
+        if self._vocab is None:
+            self._vocab = sorted(self.tokens)
+        if self._blob is None:
+            offsets = []
+            pos = 0
+            for name in self.names:
+                offsets.append(pos)
+                pos += len(name) + 1
+            self._offsets = offsets
+            self._blob = "\n".join(self.names)
+
+    def _build_grams(self):
+        # Trigram postings for every name added since the last fuzzy search
+        names = self.names
+        for cid in range(self._grams_upto, len(names)):
+            for g in trigrams(names[cid]):
+                posting = self.grams.get(g)
+                if posting is None:
+                    posting = self.grams[g] = array('I')
+                posting.append(cid)
+        self._grams_upto = len(names)
+
+    def _prefix_ids(self, prefix):
+        ids = set()
+        vocab = self._vocab
+        i = bisect.bisect_left(vocab, prefix)
+        while i < len(vocab) and vocab[i].startswith(prefix):
+            ids.update(self.tokens[vocab[i]])
+            i += 1
+        return ids
+
+    def _substring_ids(self, q):
+        # Yields ids in ascending order, one per matching name
+        blob, offsets = self._blob, self._offsets
+        start = blob.find(q)
+        while start != -1:
+            cid = bisect.bisect_right(offsets, start) - 1
+            yield cid
+            nxt = cid + 1
+            start = blob.find(q, offsets[nxt]) if nxt < len(offsets) else -1
+
+    def search(self, query, limit=None):
+        """
+        Returns matching channels ranked exact > prefix > word prefix > substring,
+        in load order within each rank.
+        Every source below yields ascending ids, so each rank is a lazy merge
+        and a limited query stops as soon as it has enough results.
+        """
+        q = query.lower().strip()
+        if not q:
+            return []
+        with self._lock:
+            return self._search(q, limit)
+
+    def _search(self, q, limit):
+        self._prepare()
+        ranks = ([], [], [], [])
+
+        # 1. Group (country) matches apply to every channel in the group
+        for group, ids in self.groups.items():
+            if group == q: ranks[EXACT].append(ids)
+            elif group.startswith(q): ranks[PREFIX].append(ids)
+            elif q in group: ranks[SUBSTRING].append(ids)
+
+        # 2. Exact names
+        if q in self.names_exact:
+            ranks[EXACT].append(self.names_exact[q])
+
+        # 3. Every query word is the start of some word in the name
+        words = tokenize(q)
+        if words:
+            candidates = None
+            for w in words:
+                ids = self._prefix_ids(w)
+                candidates = ids if candidates is None else candidates & ids
+                if not candidates: break
+            if candidates:
+                names = self.names
+                ordered = sorted(candidates)
+                ranks[PREFIX].append([cid for cid in ordered if names[cid].startswith(q)])
+                ranks[TOKEN_PREFIX].append(ordered)
+
+        # 4. Plain substring anywhere in the name (C-speed scan over one string)
+        ranks[SUBSTRING].append(self._substring_ids(q))
+
+        results = []
+        seen = set()
+        for sources in ranks:
+            for cid in heapq.merge(*sources):
+                if cid in seen: continue
+                seen.add(cid)
+                ch = self.channels[cid]
+                if ch is None: continue
+                results.append(ch)
+                if limit is not None and len(results) >= limit:
+                    return results
+        return results
+
+    def _similar_groups(self, q_grams):
+        for group in self.groups:
+            g_grams = self._group_grams.get(group)
+            if g_grams is None:
+                g_grams = self._group_grams[group] = trigrams(group)
+            if not g_grams: continue
+            shared = len(q_grams & g_grams)
+            score = 2.0 * shared / (len(q_grams) + len(g_grams))
+            if score >= MIN_SIMILARITY:
+                yield group, score
+
+    def fuzzy_search(self, query, limit=50):
+        """
+        Typo tolerant search ('aljazera', 'bbc wrld') ranked by trigram
+        similarity (Dice coefficient) over names and countries.
+        Rare trigrams nominate candidates, then only the best few hundred are
+        scored exactly, so the cost stays bounded on every keystroke.
+        """
+        q_grams = trigrams(query.lower())
+        if not q_grams:
+            return []
+        with self._lock:
+            return self._fuzzy_search(q_grams, limit)
+
+    def _fuzzy_search(self, q_grams, limit):
+        self._build_grams()
+
+        postings = sorted((self.grams[g] for g in q_grams if g in self.grams), key=len)
+        useful = [p for p in postings if len(p) <= MAX_TRIGRAM_POSTING]
+        if len(useful) < 2:
+            # Mostly common trigrams: the rarest couple still narrow things down
+            useful = postings[:2]
+
+        hits = Counter()
+        for posting in useful:
+            hits.update(posting)
+
+        n_query = len(q_grams)
+        scores = {}
+        for cid, _ in hits.most_common(FUZZY_CANDIDATES):
+            if self.channels[cid] is None: continue
+            name_grams = trigrams(self.names[cid])
+            score = 2.0 * len(q_grams & name_grams) / (n_query + len(name_grams))
+            if score >= MIN_SIMILARITY:
+                scores[cid] = score
+
+        # Country matches pull in their channels just below a direct name hit
+        for group, score in self._similar_groups(q_grams):
+            for cid in self.groups[group]:
+                if self.channels[cid] is not None and scores.get(cid, 0) < score * 0.9:
+                    scores[cid] = score * 0.9
+
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))
+        return [self.channels[cid] for cid, _ in best]
@@ -133,6 +133,10 @@ class VideoPlayer(ctk.CTkFrame):
         self.btn_play.configure(text="⏸")
         self.lbl_status.configure(text="Connecting...", text_color=Theme.WARNING)
 
+    def is_active(self):
+        # Opening, buffering or playing: the stream is using the network
+        return self.player.get_state() in (vlc.State.Opening, vlc.State.Buffering, vlc.State.Playing)
+
     def toggle_play(self):
         if self.player.is_playing():
             self.player.pause()
@@ -0,0 +1,219 @@
+import asyncio
+import contextlib
+import threading
+import time
+
+from playwright.async_api import async_playwright
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/110.0.0.0 Safari/537.36'
+
+LAUNCH_ARGS = [
+    '--disable-blink-features=AutomationControlled',
+    f'--user-agent={USER_AGENT}',
+]
+
+# A browser is replaced after this many contexts, this age or this much JS heap in one page
+MAX_CONTEXTS = 40
+MAX_AGE = 30 * 60
+MAX_HEAP = 512 * 1024 * 1024
+
+class _Browser:
+    """
+    One launched Chromium and its bookkeeping.
+    """
+    def __init__(self, browser):
+        self.browser = browser
+        self.launched_at = time.monotonic()
+        self.served = 0
+        self.in_use = 0
+        self.retired = False
+
+    def worn_out(self, max_contexts, max_age):
+        return self.served >= max_contexts or time.monotonic() - self.launched_at > max_age
+
+class BrowserPool:
+    """
+    Long-lived headless Chromium shared by all scans.
+    The browser is launched lazily (or ahead of time with warm()), checked
+    before every use and replaced after MAX_CONTEXTS contexts, MAX_AGE seconds
+    or a page reporting more than MAX_HEAP of JS heap. A retired browser is
+    closed once its last context is released.
+    Every scan gets a fresh, isolated context; one spare context is kept
+    pre-created so the next scan can start navigating right away.
+    Runs on its own asyncio loop thread (Playwright objects must stay on it).
+    """
+    def __init__(self, max_contexts=MAX_CONTEXTS, max_age=MAX_AGE, max_heap=MAX_HEAP, headless=True):
+        self.max_contexts = max_contexts
+        self.max_age = max_age
+        self.max_heap = max_heap
+        self.headless = headless
+
+        self._loop = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+        # Created lazily on the loop thread
+        self._playwright = None
+        self._current = None
+        self._launch_lock = None
+        self._spare = None
+        self._spare_task = None
+        self._owners = {}
+
+    # --- Loop management ---
+    def _ensure_loop(self):
+        with self._start_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="BrowserPool", daemon=True)
+                self._thread.start()
+        return self._loop
+
+    def submit(self, coro):
+        """
+        Schedules a coroutine on the pool loop, returns a concurrent.futures.Future.
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    def warm(self):
+        """
+        Launches the browser and prepares the spare context in the background.
+        """
+        async def _warm():
+            try:
+                await self._browser()
+                self._fill_spare()
+            except Exception as e:
+                print(f"Browser warm-up failed: {e}")
+        return self.submit(_warm())
+
+    def close(self):
+        if self._loop is None: return
+        try:
+            self.submit(self._shutdown()).result(timeout=10)
+        except Exception:
+            pass
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+    async def _shutdown(self):
+        if self._spare_task: self._spare_task.cancel()
+        holders = {id(h): h for h in self._owners.values()}
+        if self._current: holders[id(self._current)] = self._current
+        for holder in holders.values():
+            await self._close_browser(holder)
+        self._current = None
+        self._spare = None
+        if self._playwright:
+            await self._playwright.stop()
+            self._playwright = None
+
+    # --- Browser lifecycle (loop side) ---
+    async def _browser(self):
+        if self._launch_lock is None:
+            self._launch_lock = asyncio.Lock()
+        async with self._launch_lock:
+            holder = self._current
+            if holder is not None and (not holder.browser.is_connected()
+                                       or holder.worn_out(self.max_contexts, self.max_age)):
+                await self._retire(holder)
+                holder = None
+            if holder is None:
+                if self._playwright is None:
+                    self._playwright = await async_playwright().start()
+                browser = await self._playwright.chromium.launch(headless=self.headless, args=LAUNCH_ARGS)
+                holder = self._current = _Browser(browser)
+            return holder
+
+    async def _retire(self, holder):
+        holder.retired = True
+        if self._current is holder:
+            self._current = None
+        spare = self._spare
+        if spare is not None and self._owners.get(id(spare)) is holder:
+            self._spare = None
+            await self._close_context(spare)
+        if holder.in_use == 0:
+            await self._close_browser(holder)
+
+    async def _close_browser(self, holder):
+        try:
+            await holder.browser.close()
+        except Exception:
+            pass
+
+    async def _close_context(self, context):
+        holder = self._owners.pop(id(context), None)
+        try:
+            await context.close()
+        except Exception:
+            pass
+        return holder
+
+    async def _new_context(self):
+        holder = await self._browser()
+        context = await holder.browser.new_context(
+            user_agent=USER_AGENT,
+            viewport={'width': 1280, 'height': 720}
+        )
+        holder.served += 1
+        self._owners[id(context)] = holder
+        return context
+
+    def _fill_spare(self):
+        if self._spare is not None or (self._spare_task and not self._spare_task.done()):
+            return
+        async def _make():
+            try:
+                self._spare = await self._new_context()
+            except Exception as e:
+                print(f"Could not prepare browser context: {e}")
+        self._spare_task = asyncio.ensure_future(_make())
+
+    # --- Contexts ---
+    async def acquire(self):
+        """
+        Returns a fresh BrowserContext for one scan; hand it back with release().
+        """
+        context = self._spare
+        self._spare = None
+        holder = self._owners.get(id(context)) if context is not None else None
+        if holder is None or holder.retired or not holder.browser.is_connected():
+            if context is not None:
+                await self._close_context(context)
+            context = await self._new_context()
+            holder = self._owners[id(context)]
+        holder.in_use += 1
+        self._fill_spare()
+        return context
+
+    async def release(self, context):
+        """
+        Closes a scan's context. Checks the JS heap of its pages first and
+        retires the browser when one grew past max_heap.
+        """
+        heap = 0
+        for page in list(context.pages):
+            try:
+                used = await page.evaluate("performance.memory ? performance.memory.usedJSHeapSize : 0")
+                heap = max(heap, used or 0)
+            except Exception:
+                pass
+        holder = await self._close_context(context)
+        if holder is None: return
+        holder.in_use -= 1
+        if heap > self.max_heap and not holder.retired:
+            print(f"Recycling browser (page heap {heap // (1024 * 1024)} MB)")
+            await self._retire(holder)
+        elif holder.retired and holder.in_use == 0:
+            await self._close_browser(holder)
+
+    @contextlib.asynccontextmanager
+    async def context(self):
+        """
+        async with pool.context() as context: ...
+        """
+        context = await self.acquire()
+        try:
+            yield context
+        finally:
+            await self.release(context)
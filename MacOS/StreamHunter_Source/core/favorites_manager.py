@@ -1,10 +1,73 @@
+import atexit
 import json
 import os
+import threading
+import time
+
+# A failing favorite is retried after 15 min, 30 min, 1 h ... at most once a day
+RETRY_BASE = 15 * 60
+RETRY_MAX = 24 * 3600
+
+# Changes are coalesced for this long before favorites.json is rewritten
+SAVE_DELAY = 1.0
+
+# channels(sort=...) orders; SORT_ADDED is the custom order (added order, changed with move_channel)
+SORT_ADDED, SORT_MOST_WATCHED, SORT_RECENT, SORT_HEALTH = "added", "most_watched", "recent", "health"
+
+# Weight of the newest probe in a favorite's health score (moving average)
+HEALTH_WEIGHT = 0.3
+
+def sort_channels(channels, sort):
+    if sort == SORT_MOST_WATCHED:
+        return sorted(channels, key=lambda c: (c.get('play_count', 0), c.get('last_played') or 0), reverse=True)
+    if sort == SORT_RECENT:
+        return sorted(channels, key=lambda c: c.get('last_played') or 0, reverse=True)
+    if sort == SORT_HEALTH:
+        # Never checked favorites go last
+        return sorted(channels, key=lambda c: (c.get('health_score') is not None, c.get('health_score') or 0), reverse=True)
+    return list(channels)
+
+def update_health(ch, ok, now):
+    """
+    Applies one probe outcome to a favorite dict: offline flag, retry backoff
+    and health score.
+    """
+    ch['last_check'] = now
+    score = ch.get('health_score')
+    ch['health_score'] = float(ok) if score is None else score * (1 - HEALTH_WEIGHT) + ok * HEALTH_WEIGHT
+    if ok:
+        ch['offline'] = False
+        ch['fail_count'] = 0
+        ch['next_check'] = 0
+    else:
+        fails = ch.get('fail_count', 0) + 1
+        ch['offline'] = True
+        ch['fail_count'] = fails
+        ch['next_check'] = now + min(RETRY_BASE * 2 ** (fails - 1), RETRY_MAX)
 
 class FavoritesManager:
-    def __init__(self, filename="favorites.json"):
+    """
+    Favorite channels and countries, persisted to favorites.json.
+    Both are kept in insertion ordered dicts (channels keyed by url,
+    countries used as an ordered set) so membership checks, adds and
+    removals cost the same with ten favorites or ten thousand.
+    """
+    def __init__(self, filename="favorites.json", save_delay=SAVE_DELAY):
         self.filename = filename
-        self.favorites = self.load_favorites()
+        self.save_delay = save_delay
+        # Guards the favorites and the pending timer; _write_lock serializes file writers
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        self._timer = None
+        self._dirty = False
+        
+        data = self.load_favorites()
+        self._channels = {}
+        for ch in data.get("channels", []):
+            if ch.get('url'): self._channels.setdefault(ch['url'], ch)
+        self._countries = dict.fromkeys(data.get("countries", []))
+        # Nothing pending may be lost when the app exits
+        atexit.register(self.flush)
         
     def load_favorites(self):
         if not os.path.exists(self.filename):
@@ -14,39 +77,148 @@ class FavoritesManager:
                 return json.load(f)
         except:
             return {"channels": [], "countries": []}
-            
+
+    @property
+    def favorites(self):
+        # Same shape as favorites.json (a snapshot, mutate through the methods)
+        with self._lock:
+            return {"channels": list(self._channels.values()), "countries": list(self._countries)}
+
+    def channels(self, sort=SORT_ADDED):
+        with self._lock:
+            return sort_channels(self._channels.values(), sort)
+
+    def countries(self):
+        with self._lock:
+            return list(self._countries)
+
+    def get_channel(self, url):
+        return self._channels.get(url)
+
+    def channel_urls(self):
+        with self._lock:
+            return set(self._channels)
+
     def save_favorites(self):
-        try:
-            with open(self.filename, 'w', encoding='utf-8') as f:
-                json.dump(self.favorites, f, indent=4)
-        except Exception as e:
-            print(f"Error saving favorites: {e}")
+        """
+        Write-behind: marks the favorites dirty and (re)starts a short timer,
+        so a burst of changes ends up as a single file write.
+        """
+        with self._lock:
+            self._dirty = True
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.save_delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        """
+        Writes pending changes now (temp file + fsync + rename, never a half written file).
+        """
+        with self._write_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                if not self._dirty: return
+                self._dirty = False
+                text = json.dumps({"channels": list(self._channels.values()), "countries": list(self._countries)}, indent=4)
+            try:
+                tmp = self.filename + ".tmp"
+                with open(tmp, 'w', encoding='utf-8') as f:
+                    f.write(text)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp, self.filename)
+            except Exception as e:
+                print(f"Error saving favorites: {e}")
+                with self._lock:
+                    self._dirty = True
+
+    def close(self):
+        self.flush()
 
     def add_channel(self, channel_info):
         # channel_info: {name, url, group}
-        # Check if exists
-        for ch in self.favorites["channels"]:
-            if ch['url'] == channel_info['url']:
+        with self._lock:
+            if channel_info['url'] in self._channels:
                 return # Already exists
-        self.favorites["channels"].append(channel_info)
-        self.save_favorites()
+            self._channels[channel_info['url']] = channel_info
+            self.save_favorites()
 
     def remove_channel(self, url):
-        self.favorites["channels"] = [c for c in self.favorites["channels"] if c['url'] != url]
-        self.save_favorites()
+        with self._lock:
+            if self._channels.pop(url, None) is not None:
+                self.save_favorites()
+
+    def move_channel(self, url, index):
+        """
+        Moves a favorite to position index of the custom (SORT_ADDED) order.
+        """
+        with self._lock:
+            ch = self._channels.pop(url, None)
+            if ch is None: return False
+            items = list(self._channels.items())
+            index = max(0, min(index, len(items)))
+            items.insert(index, (url, ch))
+            self._channels = dict(items)
+            self.save_favorites()
+            return True
         
     def add_country(self, country_name):
-        if country_name not in self.favorites["countries"]:
-            self.favorites["countries"].append(country_name)
-            self.save_favorites()
+        with self._lock:
+            if country_name not in self._countries:
+                self._countries[country_name] = None
+                self.save_favorites()
             
     def remove_country(self, country_name):
-        if country_name in self.favorites["countries"]:
-            self.favorites["countries"].remove(country_name)
+        with self._lock:
+            if country_name in self._countries:
+                del self._countries[country_name]
+                self.save_favorites()
+
+    def due_channels(self, now=None):
+        """
+        Favorite channels whose next health check is due (never checked ones included).
+        """
+        now = now or time.time()
+        with self._lock:
+            return [c for c in self._channels.values() if c.get('next_check', 0) <= now]
+
+    def apply_results(self, results, now=None):
+        """
+        Records probe outcomes {url: result} on the favorites and saves once.
+        Failing favorites are kept but marked offline, with an exponential
+        retry backoff; one good probe brings them back.
+        Returns (online, offline) counts for the favorites that were updated.
+        """
+        now = now or time.time()
+        online = offline = 0
+        with self._lock:
+            for url, result in results.items():
+                ch = self._channels.get(url)
+                if ch is None: continue
+                update_health(ch, bool(result), now)
+                if result: online += 1
+                else: offline += 1
+            if online or offline:
+                self.save_favorites()
+        return online, offline
+
+    def record_play(self, url, now=None):
+        """
+        Counts a playback of a favorite (feeds the most watched / recent orders).
+        """
+        with self._lock:
+            ch = self._channels.get(url)
+            if ch is None: return
+            ch['play_count'] = ch.get('play_count', 0) + 1
+            ch['last_played'] = now or time.time()
             self.save_favorites()
 
     def is_channel_fav(self, url):
-        return any(c['url'] == url for c in self.favorites["channels"])
+        return url in self._channels
         
     def is_country_fav(self, name):
-        return name in self.favorites["countries"]
+        return name in self._countries
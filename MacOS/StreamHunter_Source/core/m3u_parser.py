@@ -0,0 +1,127 @@
+import sys
+
+from core.channel import Channel
+
+# EXTINF attribute -> Channel field
+ATTRIBUTES = {
+    'tvg-id': 'tvg_id',
+    'tvg-logo': 'tvg_logo',
+    'tvg-country': 'tvg_country',
+    'tvg-language': 'tvg_language',
+    'user-agent': 'user_agent',
+    'http-user-agent': 'user_agent',
+    'http-referrer': 'referer',
+    'http-referer': 'referer',
+}
+
+# #EXTVLCOPT option -> Channel field
+VLC_OPTIONS = {
+    'http-user-agent': 'user_agent',
+    'http-referrer': 'referer',
+    'http-referer': 'referer',
+}
+
+def parse_extinf(line):
+    """
+    Single pass tokenizer for '#EXTINF:-1 key="value" key2=value2,Display Name'.
+    Quoted values may contain commas and spaces. Returns (attrs, name).
+    """
+    attrs = {}
+    n = len(line)
+    i = line.find(':') + 1
+
+    # Skip the duration
+    while i < n and line[i] != ' ' and line[i] != ',':
+        i += 1
+
+    while i < n:
+        c = line[i]
+        if c == ',':
+            return attrs, line[i + 1:].strip()
+        if c == ' ' or c == '\t':
+            i += 1
+            continue
+
+        eq = line.find('=', i)
+        comma = line.find(',', i)
+        if eq == -1 or (comma != -1 and comma < eq):
+            # No more attributes, only the name is left
+            if comma == -1: break
+            return attrs, line[comma + 1:].strip()
+
+        key = line[i:eq].strip().lower()
+        if eq + 1 < n and line[eq + 1] == '"':
+            end = line.find('"', eq + 2)
+            if end == -1: end = n
+            attrs[key] = line[eq + 2:end]
+            i = end + 1
+        else:
+            end = eq + 1
+            while end < n and line[end] != ' ' and line[end] != ',':
+                end += 1
+            attrs[key] = line[eq + 1:end]
+            i = end
+
+    return attrs, ""
+
+def _new_channel(attrs, name):
+    group = attrs.get('group-title') or "Others"
+    ch = Channel(name or "Unknown", None, sys.intern(group))
+    for key, field in ATTRIBUTES.items():
+        value = attrs.get(key)
+        if value:
+            setattr(ch, field, value)
+    # Country / language codes repeat constantly, share the strings
+    if ch.tvg_country: ch.tvg_country = sys.intern(ch.tvg_country)
+    if ch.tvg_language: ch.tvg_language = sys.intern(ch.tvg_language)
+    return ch
+
+def iter_m3u(lines):
+    """
+    Incremental M3U parser.
+    lines: any iterable of text lines (a list, a file, a streaming response...)
+    Yields a Channel as soon as each URL line is seen.
+    """
+    pending = None
+    last = None
+
+    for line in lines:
+        line = line.strip()
+        if not line: continue
+
+        if line.startswith("#EXTINF"):
+            attrs, name = parse_extinf(line)
+            pending = _new_channel(attrs, name)
+
+        elif line.startswith("#EXTVLCOPT"):
+            if pending is None: continue
+            key, _, value = line[len("#EXTVLCOPT:"):].partition('=')
+            field = VLC_OPTIONS.get(key.strip().lower())
+            if field and value:
+                setattr(pending, field, value.strip())
+
+        elif not line.startswith("#"):
+            if pending is None:
+                # Bare URL: reuse the previous entry's title and group
+                if last is None:
+                    pending = Channel("Unknown", None, "Uncategorized")
+                else:
+                    pending = Channel(last.name, None, last.group)
+            pending.url = line
+            yield pending
+            last = pending
+            pending = None
+
+def iter_m3u_chunks(lines, chunk_size=500):
+    """
+    Same as iter_m3u but batches results so consumers (UI, progress) are
+    not woken up once per channel.
+    """
+    chunk = []
+    for ch in iter_m3u(lines):
+        chunk.append(ch)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
@@ -0,0 +1,132 @@
+import json
+import os
+from urllib.parse import urlsplit
+
+# Resource types a stream scan never needs
+BLOCKED_TYPES = {'image', 'font', 'media'}
+
+# Media segments (the playlists themselves are still let through); images and
+# fonts are left to block_types so site rules can allow them
+SEGMENT_EXTENSIONS = ('.ts', '.m4s', '.aac', '.m4a', '.m4v', '.mp4', '.webm')
+
+# Ad / analytics hosts (subdomains included)
+AD_HOSTS = {
+    'doubleclick.net', 'googlesyndication.com', 'googleadservices.com', 'google-analytics.com',
+    'googletagmanager.com', 'googletagservices.com', 'adservice.google.com', 'amazon-adsystem.com',
+    'adnxs.com', 'adsrvr.org', 'criteo.com', 'criteo.net', 'pubmatic.com', 'rubiconproject.com',
+    'openx.net', 'taboola.com', 'outbrain.com', 'scorecardresearch.com', 'quantserve.com',
+    'moatads.com', 'hotjar.com', 'facebook.net', 'connect.facebook.net', 'popads.net',
+    'popcash.net', 'propellerads.com', 'exoclick.com', 'juicyads.com', 'histats.com',
+    'mc.yandex.ru', 'clarity.ms', 'onesignal.com', 'disqus.com', 'addthis.com', 'sharethis.com',
+}
+
+PLAYLIST_HINTS = ('.m3u8', '.m3u', '.mpd')
+
+def host_matches(host, domains):
+    """
+    True if host is one of domains or a subdomain of one.
+    """
+    host = (host or "").lower()
+    while host:
+        if host in domains:
+            return True
+        dot = host.find('.')
+        if dot == -1:
+            return False
+        host = host[dot + 1:]
+    return False
+
+class ResourceFilter:
+    """
+    Decides which requests of a scanned page are aborted: images, fonts,
+    media segments and ad / tracker hosts by default.
+    Per site rules, keyed by the scanned page's domain, can add hosts to
+    always allow or deny and change the blocked resource types, e.g.
+    {"example.com": {"allow": ["cdn.example.net"], "deny": ["ads.example.com"],
+                     "block_types": ["image", "font", "stylesheet"]}}
+    """
+    def __init__(self, allow=(), deny=(), block_types=BLOCKED_TYPES, block_ads=True, site_rules=None):
+        self.allow = set(allow)
+        self.deny = set(deny)
+        self.block_types = set(block_types)
+        self.block_ads = block_ads
+        self.site_rules = site_rules or {}
+
+    @classmethod
+    def load(cls, path="scan_rules.json"):
+        """
+        Default filter plus the rules in path, if that file exists:
+        {"allow": [...], "deny": [...], "block_types": [...], "block_ads": true,
+         "sites": {domain: {"allow": [...], "deny": [...], "block_types": [...]}}}
+        """
+        if not os.path.exists(path):
+            return cls()
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return cls(
+                allow=data.get('allow', ()),
+                deny=data.get('deny', ()),
+                block_types=data.get('block_types', BLOCKED_TYPES),
+                block_ads=data.get('block_ads', True),
+                site_rules=data.get('sites', {}),
+            )
+        except Exception as e:
+            print(f"Ignoring {path}: {e}")
+            return cls()
+
+    def rules_for(self, page_url):
+        """
+        (allow, deny, block_types) in effect for pages of this site.
+        """
+        host = (urlsplit(page_url).hostname or "").lower()
+        allow, deny, block_types = self.allow, self.deny, self.block_types
+        while host:
+            rule = self.site_rules.get(host)
+            if rule:
+                allow = allow | set(rule.get('allow', ()))
+                deny = deny | set(rule.get('deny', ()))
+                if 'block_types' in rule:
+                    block_types = set(rule['block_types'])
+                break
+            dot = host.find('.')
+            if dot == -1: break
+            host = host[dot + 1:]
+        return allow, deny, block_types
+
+    def should_block(self, url, resource_type, rules):
+        allow, deny, block_types = rules
+        parts = urlsplit(url)
+        host = parts.hostname
+        if host_matches(host, allow):
+            return False
+        if host_matches(host, deny):
+            return True
+        path = parts.path.lower()
+        # Never hide the thing we are looking for
+        if path.endswith(PLAYLIST_HINTS):
+            return False
+        if resource_type in block_types:
+            return True
+        if path.endswith(SEGMENT_EXTENSIONS):
+            return True
+        return self.block_ads and host_matches(host, AD_HOSTS)
+
+    async def install(self, context, page_url):
+        """
+        Routes every request of a browser context through the filter.
+        """
+        rules = self.rules_for(page_url)
+
+        async def handle(route):
+            request = route.request
+            try:
+                if self.should_block(request.url, request.resource_type, rules):
+                    await route.abort()
+                else:
+                    await route.continue_()
+            except Exception:
+                # Page or context already gone
+                pass
+
+        await context.route("**/*", handle)
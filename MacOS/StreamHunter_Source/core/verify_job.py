@@ -0,0 +1,160 @@
+import asyncio
+import threading
+
+# Probes in flight per job; every job still draws from the prober's shared bulk budget
+JOB_WORKERS = 64
+# Health store writes are batched instead of one transaction per channel
+HEALTH_FLUSH_EVERY = 100
+
+class VerifyJob:
+    """
+    Verification of one category, run on the prober's event loop.
+    Verdicts are applied (dead channels removed) and reported one by one as
+    they arrive instead of after the whole group finished. The job can be
+    paused, resumed and cancelled from any thread.
+
+    on_result(channel, result)  after each verdict
+    on_progress(job)            after each verdict, read job.done / job.total
+    on_done(job)                once, also after a cancel
+    Channels of hosts whose circuit breaker is open are never probed: they
+    are counted as skipped and kept, not removed.
+    Callbacks run on the prober loop thread; UI code has to marshal them.
+    """
+    def __init__(self, manager, group, on_result=None, on_progress=None, on_done=None, workers=JOB_WORKERS):
+        self.manager = manager
+        self.group = group
+        self.on_result = on_result
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.workers = workers
+
+        self.channels = manager.channels_in(group)
+        self.total = len(self.channels)
+        self.done = 0
+        self.alive = 0
+        self.dead = 0
+        self.skipped = 0
+        self.results = {}
+
+        self.cancelled = False
+        self.finished = False
+        self._future = None
+        self._task = None
+        self._resume = None
+        self._paused = False
+        self._finished_event = threading.Event()
+
+    # --- Control (thread safe) ---
+    def start(self):
+        self._future = self.manager.prober.submit(self._run())
+        return self
+
+    def cancel(self):
+        # A job that has not started yet sees the flag and stops right away
+        self.cancelled = True
+        loop = self.manager.prober._loop
+        if loop is not None and self._task is not None:
+            loop.call_soon_threadsafe(self._task.cancel)
+
+    def pause(self):
+        # Probes already in flight still finish, no new ones are started
+        self._set_paused(True)
+
+    def resume(self):
+        self._set_paused(False)
+
+    @property
+    def paused(self):
+        return self._paused
+
+    @property
+    def running(self):
+        return self._future is not None and not self.finished
+
+    def wait(self, timeout=None):
+        return self._finished_event.wait(timeout)
+
+    def _set_paused(self, paused):
+        self._paused = paused
+        loop = self.manager.prober._loop
+        if loop is None or self._resume is None: return
+        loop.call_soon_threadsafe(self._resume.clear if paused else self._resume.set)
+
+    # --- Loop side ---
+    async def _run(self):
+        self._task = asyncio.current_task()
+        self._resume = asyncio.Event()
+        if not self._paused: self._resume.set()
+        pending_health = []
+        try:
+            if self.cancelled: return
+            # 1. Fresh results from the health store are verdicts right away
+            cached = self.manager.health.get_many(c.url for c in self.channels)
+            queue = asyncio.Queue()
+            for ch in self.channels:
+                result = cached.get(ch.url)
+                if result is not None:
+                    self._apply(ch, result)
+                else:
+                    queue.put_nowait(ch)
+
+            # 2. A fixed set of workers pulls the rest; pausing stops them between probes
+            async def worker():
+                while not queue.empty():
+                    await self._resume.wait()
+                    # Another worker may have taken the last channel while this one was paused
+                    try:
+                        ch = queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        return
+                    headers = self.manager._stream_headers(ch.url) or None
+                    result = await self.manager.prober.probe(ch.url, headers)
+                    if not result.skipped:
+                        pending_health.append(result)
+                        if len(pending_health) >= HEALTH_FLUSH_EVERY:
+                            self.manager.health.put_many(pending_health)
+                            del pending_health[:]
+                    self._apply(ch, result)
+
+            tasks = [asyncio.ensure_future(worker()) for _ in range(min(self.workers, queue.qsize()))]
+            try:
+                await asyncio.gather(*tasks)
+            except BaseException:
+                # A failed or cancelled worker stops the rest before on_done runs
+                for t in tasks: t.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                raise
+
+            # 3. Rank what survived: best resolution / bandwidth / latency first
+            self.manager._rank_group(self.group, self.results)
+        except asyncio.CancelledError:
+            self.cancelled = True
+        except Exception as e:
+            print(f"Verification of {self.group} failed: {e}")
+        finally:
+            self.manager.health.put_many(pending_health)
+            self.finished = True
+            self._finished_event.set()
+            if self.on_done:
+                try:
+                    self.on_done(self)
+                except Exception as e:
+                    print(f"Verify callback error: {e}")
+
+    def _apply(self, ch, result):
+        self.done += 1
+        if result.skipped:
+            # No verdict: the channel keeps its place and stays in the list
+            self.skipped += 1
+        else:
+            self.results[ch.url] = result
+            if result:
+                self.alive += 1
+            else:
+                self.dead += 1
+                self.manager._remove(ch)
+        try:
+            if self.on_result: self.on_result(ch, result)
+            if self.on_progress: self.on_progress(self)
+        except Exception as e:
+            print(f"Verify callback error: {e}")
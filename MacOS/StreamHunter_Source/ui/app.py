@@ -1,12 +1,15 @@
 import customtkinter as ctk
 from tkinter import ttk
 import tkinter as tk
+from tkinter import filedialog
 import threading
+import concurrent.futures
 
 # Core imports
-from core.extractor import StreamExtractor
+from core.extractor import StreamExtractor, parse_url_list
 from core.channel_manager import ChannelManager
-from core.favorites_manager import FavoritesManager
+from core.favorites_db import open_favorites
+from core.favorites_manager import SORT_ADDED, SORT_HEALTH, SORT_MOST_WATCHED, SORT_RECENT
 
 # UI Imports
 from ui.player import VideoPlayer
@@ -16,6 +19,8 @@ from ui.theme import Theme
 ctk.set_appearance_mode("Dark")
 ctk.set_default_color_theme("dark-blue")
 
+SEARCH_DEBOUNCE_MS = 200
+
 class StreamHunterApp(ctk.CTk):
     def __init__(self):
         super().__init__()
@@ -29,7 +34,24 @@ class StreamHunterApp(ctk.CTk):
         # --- Managers ---
         self.extractor = StreamExtractor()
         self.channel_manager = ChannelManager()
-        self.fav_manager = FavoritesManager()
+        self.fav_manager = open_favorites()
+        self.fav_sort = SORT_ADDED
+        self.tree_revision = -1
+        
+        # Live search state (see schedule_search)
+        self.search_after_id = None
+        self.search_seq = 0
+        self.last_query = ""
+        self.search_rows = {}
+        self.search_order = []
+        self.search_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        
+        # Lazy category rows (see populate_tree)
+        self.category_items = {}
+        self.item_categories = {}
+        self.expanded_items = set()
+        # (url, group) -> row of a channel inside an expanded category
+        self.channel_rows = {}
         
         # --- Layout Configuration ---
         self.grid_columnconfigure(1, weight=1) # Content Area
@@ -74,12 +96,34 @@ class StreamHunterApp(ctk.CTk):
         self.active_view = None
         self.is_fullscreen = False
         self.bind("<Escape>", lambda e: self.exit_fullscreen())
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
         
         # Initial Load
         self.show_view("scanner")
         self.after(500, self.load_channels_db)
         self.after(2000, self.cleanup_favorites_on_start) # Auto-Verify Favs
         
+        # Background re-verification keeps liveness fresh (greys out dead rows)
+        scheduler = self.channel_manager.scheduler
+        scheduler.on_result = lambda url, result: self.after(0, lambda: self._on_background_verdict(url, result))
+        scheduler.set_favorites(self.fav_manager.channels())
+        self.after(10000, scheduler.start)
+        self.after(2000, self._watch_playback)
+        
+        # Headless browser is launched ahead of the first scan
+        self.after(3000, self.extractor.warm)
+        
+    def on_close(self):
+        # Let background workers shut down cleanly before the window goes
+        try:
+            self.extractor.stop()
+            self.extractor.close()
+            self.channel_manager.close()
+            self.fav_manager.close()
+        except Exception as e:
+            print(f"Error during shutdown: {e}")
+        self.destroy()
+
     def _init_sidebar_branding(self):
         brand_frame = ctk.CTkFrame(self.sidebar, fg_color="transparent")
         brand_frame.grid(row=0, column=0, padx=25, pady=(40, 20), sticky="w")
@@ -155,7 +199,7 @@ class StreamHunterApp(ctk.CTk):
         
         self.entry_url = ctk.CTkEntry(
             input_container, 
-            placeholder_text="Paste Video URL to Scan...", 
+            placeholder_text="Paste Video URL(s) to Scan...", 
             height=40,
             fg_color="transparent",
             border_width=0,
@@ -178,6 +222,20 @@ class StreamHunterApp(ctk.CTk):
         )
         btn_scan.pack(side="left", padx=(15, 0))
         
+        btn_list = ctk.CTkButton(
+            self.scanner_top_bar, 
+            text="LOAD LIST", 
+            width=120, 
+            height=50, 
+            fg_color=Theme.SURFACE_1, 
+            text_color=Theme.TEXT_WHITE,
+            hover_color=Theme.SURFACE_2, 
+            corner_radius=12,
+            font=("Segoe UI", 13, "bold"),
+            command=self.load_url_list
+        )
+        btn_list.pack(side="left", padx=(15, 0))
+        
         btn_save = ctk.CTkButton(
             self.scanner_top_bar, 
             text="EXPORT M3U", 
@@ -238,6 +296,7 @@ class StreamHunterApp(ctk.CTk):
         self.entry_search = ctk.CTkEntry(search_container, placeholder_text="Search Global Channels...", height=40, fg_color="transparent", border_width=0, font=("Segoe UI", 14))
         self.entry_search.pack(fill="x", padx=15)
         self.entry_search.bind("<Return>", self.perform_search)
+        self.entry_search.bind("<KeyRelease>", self.schedule_search)
         
         ctk.CTkButton(ctrl, text="SEARCH", width=120, height=48, fg_color=Theme.ACCENT_PRIMARY, corner_radius=10, command=lambda: self.perform_search(None)).pack(side="left", padx=15)
         
@@ -293,7 +352,11 @@ class StreamHunterApp(ctk.CTk):
         scroll.grid(row=0, column=1, sticky="ns", padx=(0, 5), pady=5)
         self.tree.configure(yscrollcommand=scroll.set)
         
+        self.tree.tag_configure("offline", foreground=Theme.TEXT_DARK)
+        
         self.tree.bind("<Double-1>", self.on_tree_double_click)
+        self.tree.bind("<<TreeviewOpen>>", self.on_tree_open)
+        self.tree.bind("<<TreeviewClose>>", self.on_tree_close)
         self.tree.bind("<Button-3>", self.on_tree_right_click)
         
         return frame
@@ -313,6 +376,11 @@ class StreamHunterApp(ctk.CTk):
         
         ctk.CTkLabel(c_frame, text="FAVORITE CHANNELS", font=("Roboto", 16, "bold"), text_color=Theme.TEXT_WHITE).grid(row=0, column=0, sticky="w", padx=20, pady=20)
         
+        sort_labels = {"Custom Order": SORT_ADDED, "Most Watched": SORT_MOST_WATCHED, "Recently Played": SORT_RECENT,
+                       "Healthiest": SORT_HEALTH}
+        ctk.CTkOptionMenu(c_frame, values=list(sort_labels), width=150, fg_color=Theme.SURFACE_2, button_color=Theme.SURFACE_3,
+                          command=lambda label: self.set_fav_sort(sort_labels[label])).grid(row=0, column=0, sticky="e", padx=20, pady=20)
+        
         self.fav_channels_frame = ctk.CTkScrollableFrame(c_frame, fg_color="transparent")
         self.fav_channels_frame.grid(row=1, column=0, sticky="nsew", padx=10, pady=10)
         
@@ -331,19 +399,45 @@ class StreamHunterApp(ctk.CTk):
 
     # --- LOGIC ---
     def start_extraction(self):
-        url = self.entry_url.get().strip()
-        if not url: return
-        if not url.startswith("http"): url = "https://" + url
+        # One URL or a pasted list of them
+        self.scan_urls(parse_url_list(self.entry_url.get()))
         
-        self.status_label.configure(text=f"Scanning {url}...", text_color=Theme.ACCENT_SECONDARY)
+    def load_url_list(self):
+        path = filedialog.askopenfilename(title="Load URL List", filetypes=[("Text files", "*.txt"), ("All files", "*.*")])
+        if not path: return
+        try:
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                urls = parse_url_list(f.read())
+        except Exception as e:
+            self.status_label.configure(text=f"Could not read list: {e}", text_color=Theme.ERROR)
+            return
+        self.scan_urls(urls)
+        
+    def scan_urls(self, urls):
+        if not urls: return
+        if self.extractor.is_running:
+            self.status_label.configure(text="A scan is already running...", text_color=Theme.WARNING)
+            return
+        
+        self.scan_total = len(urls)
+        self.scan_done = 0
+        target = urls[0] if len(urls) == 1 else f"{len(urls)} pages"
+        self.status_label.configure(text=f"Scanning {target}...", text_color=Theme.ACCENT_SECONDARY)
         self.status_indicator.configure(text_color=Theme.WARNING)
         
         for w in self.scan_results_frame.winfo_children(): w.destroy()
-        self.extractor.extract(url, self.add_scan_result, self.on_scan_complete)
+        self.extractor.extract_many(urls, self.add_scan_result, self.on_scan_page_done, self.on_scan_complete)
         
-    def add_scan_result(self, stream_info):
+    def add_scan_result(self, source_url, stream_info):
         self.after(0, lambda: self._create_result_card(stream_info))
         
+    def on_scan_page_done(self, source_url, streams):
+        def update():
+            self.scan_done += 1
+            if self.scan_total > 1 and self.extractor.is_running:
+                self.status_label.configure(text=f"Scanning pages: {self.scan_done}/{self.scan_total} ({len(self.extractor.found_streams)} streams)")
+        self.after(0, update)
+        
     def _create_result_card(self, stream_info):
         url = stream_info['url']
         name = url.split("/")[-1].split("?")[0]
@@ -361,7 +455,7 @@ class StreamHunterApp(ctk.CTk):
         btn_play = ctk.CTkButton(btn_frame, text="▶ PLAY", width=70, height=24, fg_color=Theme.ACCENT_PRIMARY, corner_radius=6, command=lambda: self.play_stream(stream_info))
         btn_play.pack(side="left")
         
-        btn_fav = ctk.CTkButton(btn_frame, text="⭐", width=30, height=24, fg_color=Theme.SURFACE_3, corner_radius=6, command=lambda: self.add_fav_channel(name, url, "Scanned"))
+        btn_fav = ctk.CTkButton(btn_frame, text="⭐", width=30, height=24, fg_color=Theme.SURFACE_3, corner_radius=6, command=lambda: self.add_fav_channel(name, url, "Scanned", stream_info))
         btn_fav.pack(side="left", padx=5)
 
     def on_scan_complete(self):
@@ -375,6 +469,10 @@ class StreamHunterApp(ctk.CTk):
         # Switch to Scanner
         self.show_view("scanner")
         self.player.load_stream(stream_info)
+        url = stream_info.get('url')
+        if url:
+            self.channel_manager.scheduler.note_played(url)
+            if self.fav_manager.is_channel_fav(url): self.fav_manager.record_play(url)
         self.status_label.configure(text=f"Playing stream...", text_color=Theme.ACCENT_PRIMARY)
         self.status_indicator.configure(text_color=Theme.ACCENT_PRIMARY)
 
@@ -438,38 +536,228 @@ class StreamHunterApp(ctk.CTk):
         
         # Fast load without verification
         self.channel_manager.fetch_channels(
-            on_complete=lambda: self.after(0, self.on_db_loaded)
+            on_complete=lambda: self.after(0, self.on_db_loaded),
+            on_progress=lambda c, t, m: self.after(0, lambda: self.on_db_progress(c, t, m)),
+            on_chunk=lambda chunk: self.after(0, lambda: self.on_db_chunk(chunk))
         )
 
     def on_db_progress(self, current, total, message="Working..."):
-        # Not used anymore but kept for compatibility
-        pass
+        if not self.channel_manager.is_loading: return
+        if total:
+            pct = min(current / total, 1.0) * 100
+            message = f"{message} {pct:.0f}%"
+        elif current:
+            message = f"{message} {current / (1024*1024):.1f} MB"
+        self.status_label.configure(text=message, text_color=Theme.WARNING)
+
+    def on_db_chunk(self, chunk):
+        # First download: grow the category list as channels arrive instead of waiting for the full list
+        if self.entry_search.get().strip(): return # Search view, refreshed in on_db_loaded
+        if not self.category_items:
+            for i in self.tree.get_children(): self.tree.delete(i)
+            
+        data = self.channel_manager.channels_by_category
+        touched = {}
+        for ch in chunk:
+            touched.setdefault(ch.group, []).append(ch)
+            
+        for cat, channels in touched.items():
+            pid = self.category_items.get(cat)
+            if pid is None:
+                pid = self._insert_category(cat)
+            self.tree.item(pid, text=f"{cat} ({len(data.get(cat, ()))})")
+            if pid in self.expanded_items:
+                for ch in channels:
+                    self.channel_rows[(ch.url, cat)] = self.tree.insert(pid, "end", text=ch['name'], values=(ch['url'], cat))
 
     def on_db_loaded(self):
-        self.btn_db_status.configure(state="normal", text="REFRESH DB")
+        # The cached list shows up first; the button stays locked until the refresh is done too
         count = sum(len(v) for v in self.channel_manager.channels_by_category.values())
-        self._set_status_ready(f"Loaded {count} channels.")
-        self.populate_tree()
+        if not self.channel_manager.is_loading:
+            self.btn_db_status.configure(state="normal", text="REFRESH DB")
+            self._set_status_ready(f"Loaded {count} channels.")
+        
+        # Skip the rebuild when a refresh came back unchanged (304)
+        if self.channel_manager.revision != self.tree_revision:
+            self.tree_revision = self.channel_manager.revision
+            if self.entry_search.get().strip():
+                self.last_query = ""
+                self.perform_search()
+            else:
+                self.populate_tree()
 
-    def populate_tree(self, items=None):
+    def _clear_tree(self):
+        # Drops every row together with the bookkeeping that points at them
         for i in self.tree.get_children(): self.tree.delete(i)
+        self.search_rows = {}
+        self.search_order = []
+        self.category_items = {}
+        self.item_categories = {}
+        self.expanded_items = set()
+        self.channel_rows = {}
+        self.channel_manager.scheduler.set_expanded(())
+        
+    def populate_tree(self, items=None):
+        self._clear_tree()
         
         if items:
             for ch in items[:300]:
                 self.tree.insert("", "end", text=ch['name'], values=(ch['url'], ch.get('group', 'Unknown')))
         else:
-            data = self.channel_manager.channels_by_category
-            for cat in sorted(data.keys()):
-                # Use a dummy value for group to make row selection easier
-                pid = self.tree.insert("", "end", text=f"{cat} ({len(data[cat])})", values=("", "Category"))
-                for ch in data[cat]:
-                    self.tree.insert(pid, "end", text=ch['name'], values=(ch['url'], cat))
-
-    def perform_search(self, event):
-        q = self.entry_search.get()
-        if not q: self.populate_tree(); return
-        res = self.channel_manager.search_channels(q)
-        self.populate_tree(res)
+            # Categories only; channels are materialized when a category is opened
+            for cat in sorted(self.channel_manager.channels_by_category.keys()):
+                self._insert_category(cat)
+
+    def _insert_category(self, cat):
+        data = self.channel_manager.channels_by_category
+        # Use a dummy value for group to make row selection easier
+        pid = self.tree.insert("", "end", text=f"{cat} ({len(data.get(cat, ()))})", values=("", "Category"))
+        # Placeholder so the expand arrow shows up
+        self.tree.insert(pid, "end", text="Loading...", values=("", ""))
+        self.category_items[cat] = pid
+        self.item_categories[pid] = cat
+        return pid
+
+    def on_tree_open(self, event):
+        # ttk focuses the item right before generating <<TreeviewOpen>>
+        item = self.tree.focus()
+        if item in self.item_categories:
+            self._expand_category(item)
+
+    def on_tree_close(self, event):
+        item = self.tree.focus()
+        if item in self.item_categories:
+            self._collapse_category(item)
+
+    def _expand_category(self, item):
+        if item in self.expanded_items: return
+        cat = self.item_categories[item]
+        self.tree.delete(*self.tree.get_children(item))
+        channels = self.channel_manager.channels_in(cat)
+        offline = self.channel_manager.known_offline(ch.url for ch in channels)
+        for ch in channels:
+            tags = ("offline",) if ch.url in offline else ()
+            self.channel_rows[(ch.url, cat)] = self.tree.insert(item, "end", text=ch['name'], values=(ch['url'], cat), tags=tags)
+        self.expanded_items.add(item)
+        self._sync_expanded()
+
+    def _collapse_category(self, item):
+        # Release the rows again, only the placeholder stays
+        if item not in self.expanded_items: return
+        cat = self.item_categories[item]
+        for ch in self.channel_manager.channels_in(cat):
+            self.channel_rows.pop((ch.url, cat), None)
+        self.tree.delete(*self.tree.get_children(item))
+        self.tree.insert(item, "end", text="Loading...", values=("", ""))
+        self.expanded_items.discard(item)
+        self._sync_expanded()
+        
+    def _sync_expanded(self):
+        # Open categories are re-verified ahead of the rest of the catalog
+        self.channel_manager.scheduler.set_expanded(self.item_categories[i] for i in self.expanded_items)
+        
+    def _watch_playback(self):
+        # Background probes step aside while a stream is using the bandwidth
+        try:
+            self.channel_manager.scheduler.set_paused("playback", self.player.is_active())
+        except Exception as e:
+            print(f"Playback watch error: {e}")
+        self.after(2000, self._watch_playback)
+        
+    def _on_background_verdict(self, url, result):
+        if self.fav_manager.is_channel_fav(url):
+            was_offline = self.fav_manager.get_channel(url).get('offline')
+            self.fav_manager.apply_results({url: result})
+            self.channel_manager.scheduler.update_favorite(self.fav_manager.get_channel(url))
+            # Never checked favorites have no flag yet, a first failure still has to show
+            if bool(was_offline) == bool(result): self.refresh_favorites_view()
+            
+        # Grey out (or restore) every visible row of this stream
+        tags = () if result else ("offline",)
+        groups = [ch.group for ch in self.channel_manager.channels_by_url.get(url, ())]
+        for group in groups:
+            for rows in (self.channel_rows, self.search_rows):
+                iid = rows.get((url, group))
+                if iid and self.tree.exists(iid):
+                    self.tree.item(iid, tags=tags)
+
+    def _channel_stream_info(self, url, group=None):
+        # Loaded channels carry user-agent / referrer hints from the playlist
+        ch = self.channel_manager.find_channel(url, group)
+        return ch if ch else {'url': url}
+
+    def schedule_search(self, event=None):
+        # Debounce: only search once typing pauses
+        if self.entry_search.get() == self.last_query: return
+        if self.search_after_id:
+            self.after_cancel(self.search_after_id)
+        self.search_after_id = self.after(SEARCH_DEBOUNCE_MS, self.perform_search)
+
+    def perform_search(self, event=None):
+        if self.search_after_id:
+            self.after_cancel(self.search_after_id)
+            self.search_after_id = None
+            
+        q = self.entry_search.get().strip()
+        self.last_query = self.entry_search.get()
+        self.search_seq += 1
+        seq = self.search_seq
+        
+        if not q:
+            self.populate_tree()
+            return
+            
+        def run():
+            # A newer keystroke already superseded this query
+            if seq != self.search_seq: return
+            try:
+                res = self.channel_manager.search_channels(q, limit=300)
+            except Exception as e:
+                print(f"Search error: {e}")
+                return
+            self.after(0, lambda: self._apply_search_results(seq, res))
+            
+        self.search_executor.submit(run)
+
+    def _apply_search_results(self, seq, results):
+        """
+        Updates the flat result list in place: rows that are still wanted stay,
+        stale ones go, new ones are inserted at their ranked position.
+        """
+        if seq != self.search_seq: return
+        
+        if not self.search_rows and self.tree.get_children():
+            # Leaving the category view
+            self._clear_tree()
+            
+        wanted = []
+        channels = {}
+        for ch in results:
+            key = (ch['url'], ch.get('group', 'Unknown'))
+            if key in channels: continue
+            channels[key] = ch
+            wanted.append(key)
+            
+        offline = self.channel_manager.known_offline(key[0] for key in wanted if key not in self.search_rows)
+            
+        for key in [k for k in self.search_order if k not in channels]:
+            self.tree.delete(self.search_rows.pop(key))
+        current = [k for k in self.search_order if k in channels]
+        
+        for pos, key in enumerate(wanted):
+            if pos < len(current) and current[pos] == key: continue
+            iid = self.search_rows.get(key)
+            if iid is None:
+                ch = channels[key]
+                tags = ("offline",) if key[0] in offline else ()
+                iid = self.tree.insert("", pos, text=ch['name'], values=key, tags=tags)
+                self.search_rows[key] = iid
+            else:
+                self.tree.move(iid, "", pos)
+                current.remove(key)
+            current.insert(pos, key)
+            
+        self.search_order = wanted
 
     def on_tree_double_click(self, event):
         item = self.tree.focus()
@@ -477,10 +765,16 @@ class StreamHunterApp(ctk.CTk):
         vals = self.tree.item(item)['values']
         # Check if it has a URL
         if vals and vals[0]: 
-            self.play_stream({'url': vals[0]})
-        else:
-            if self.tree.item(item, "open"): self.tree.item(item, open=False)
-            else: self.tree.item(item, open=True)
+            self.play_stream(self._channel_stream_info(vals[0], vals[1]))
+        elif item in self.item_categories:
+            # Toggle ourselves (programmatic open does not fire <<TreeviewOpen>>)
+            if self.tree.item(item, "open"):
+                self.tree.item(item, open=False)
+                self._collapse_category(item)
+            else:
+                self._expand_category(item)
+                self.tree.item(item, open=True)
+            return "break"
             
     def on_tree_right_click(self, event):
         item = self.tree.identify_row(event.y)
@@ -490,10 +784,11 @@ class StreamHunterApp(ctk.CTk):
         menu = tk.Menu(self, tearoff=0, bg=Theme.SURFACE_2, fg="white", activebackground=Theme.ACCENT_PRIMARY)
         vals = self.tree.item(item)['values']
         text = self.tree.item(item)['text']
+        if not (vals and vals[0]) and item not in self.item_categories: return # Placeholder row
         
         if vals and vals[0]:
-             menu.add_command(label="▶ Play", command=lambda: self.play_stream({'url':vals[0]}))
-             menu.add_command(label="⭐ Add to Favorites", command=lambda: self.add_fav_channel(text, vals[0], vals[1]))
+             menu.add_command(label="▶ Play", command=lambda: self.play_stream(self._channel_stream_info(vals[0], vals[1])))
+             menu.add_command(label="⭐ Add to Favorites", command=lambda: self.add_fav_channel(text, vals[0], vals[1], self._channel_stream_info(vals[0], vals[1])))
              menu.add_separator()
              menu.add_command(label="🧪 Test & Eliminate (If Broken)", command=lambda: self.test_and_eliminate_channel(vals[0], item, vals[1]))
              menu.add_command(label="🗑 Remove from List", command=lambda: self.manually_remove_channel(vals[0], item, vals[1]))
@@ -504,75 +799,123 @@ class StreamHunterApp(ctk.CTk):
              country = text.split(" (")[0]
              menu.add_command(label=f"📌 Pin Country '{country}'", command=lambda: self.add_fav_country(country))
              menu.add_separator()
-             menu.add_command(label=f"🧪 Test All Channels in '{country}'", command=lambda: self.run_category_test(country, item))
+             job = self.channel_manager.verify_jobs.get(country)
+             if job and job.running:
+                 if job.paused:
+                     menu.add_command(label="▶ Resume Test", command=job.resume)
+                 else:
+                     menu.add_command(label="⏸ Pause Test", command=job.pause)
+                 menu.add_command(label="✖ Cancel Test", command=job.cancel)
+             else:
+                 menu.add_command(label=f"🧪 Test All Channels in '{country}'", command=lambda: self.run_category_test(country, item))
              
         menu.tk_popup(event.x_root, event.y_root)
 
     def manually_remove_channel(self, url, item_id, group):
         self.channel_manager.remove_channel(url, group)
-        self.tree.delete(item_id)
+        self._drop_channel_rows(url, group)
+        if self.tree.exists(item_id): self.tree.delete(item_id)
+        
+    def _drop_channel_rows(self, url, group):
+        key = (url, group)
+        iid = self.channel_rows.pop(key, None)
+        if iid and self.tree.exists(iid): self.tree.delete(iid)
+        iid = self.search_rows.pop(key, None)
+        if iid:
+            self.search_order.remove(key)
+            if self.tree.exists(iid): self.tree.delete(iid)
+            
+    def _update_category_count(self, group):
+        pid = self.category_items.get(group)
+        if pid and self.tree.exists(pid):
+            count = len(self.channel_manager.channels_by_category.get(group, ()))
+            self.tree.item(pid, text=f"{group} ({count})")
         
     def test_and_eliminate_channel(self, url, item_id, group):
         self._set_status_ready("Testing stream availability...")
         
         def run_test():
-            is_valid = self.channel_manager.verify_stream_url(url)
-            self.after(0, lambda: self._handle_test_result(is_valid, url, item_id, group))
+            result = self.channel_manager.probe_stream(url)
+            self.after(0, lambda: self._handle_test_result(result, url, item_id, group))
             
         threading.Thread(target=run_test, daemon=True).start()
         
-    def _handle_test_result(self, is_valid, url, item_id, group):
-        if is_valid:
-            self.status_label.configure(text="✔ Stream is ONLINE", text_color=Theme.SUCCESS)
+    def _handle_test_result(self, result, url, item_id, group):
+        if result.ok:
+            self.status_label.configure(text=f"✔ Stream is ONLINE ({result.summary()})", text_color=Theme.SUCCESS)
         else:
-            self.status_label.configure(text="✖ Stream is DEAD - Removing...", text_color=Theme.ERROR)
+            self.status_label.configure(text=f"✖ Stream is DEAD ({result.summary()}) - Removing...", text_color=Theme.ERROR)
             self.manually_remove_channel(url, item_id, group)
             
     def run_category_test(self, group, item_id):
+        # Each verdict lands in the tree as it arrives; dead rows disappear right away
         self.btn_db_status.configure(state="disabled")
+        self.channel_manager.start_verify_group(
+            group,
+            on_result=lambda ch, result: self.after(0, lambda: self._on_verdict(ch, result)),
+            on_done=lambda job: self.after(0, lambda: self._on_cat_test_done(job))
+        )
         
-        def on_prog(done, total):
-            pct = (done/total)*100
-            self.after(0, lambda: self.status_label.configure(text=f"Testing {group}: {done}/{total} ({pct:.0f}%)"))
-            
-        def run():
-            self.channel_manager.verify_group(group, on_prog)
-            self.after(0, lambda: self._on_cat_test_done(group, item_id))
-            
-        threading.Thread(target=run, daemon=True).start()
-        
-    def _on_cat_test_done(self, group, item_id):
-        self.btn_db_status.configure(state="normal")
-        self._set_status_ready(f"Verified {group}. Reloading view...")
-        # Refresh tree or just that category (easier to refresh all or user must re-open)
-        # Ideally, we should update the text count
-        count = len(self.channel_manager.channels_by_category.get(group, []))
-        self.tree.item(item_id, text=f"{group} ({count})")
-        
-        # Close and Reopen to refresh children
-        if self.tree.item(item_id, "open"):
-             self.tree.item(item_id, open=False)
-             self.tree.item(item_id, open=True)
-             pass
+    def _on_verdict(self, ch, result):
+        if result.skipped:
+            # Host looks down, the channel was not checked: grey it out, keep it
+            iid = self.channel_rows.get((ch.url, ch.group))
+            if iid and self.tree.exists(iid):
+                self.tree.item(iid, tags=("offline",))
+        elif not result:
+            self._drop_channel_rows(ch.url, ch.group)
+            self._update_category_count(ch.group)
+        
+        jobs = [j for j in self.channel_manager.running_jobs() if j.running]
+        if not jobs: return
+        done = sum(j.done for j in jobs)
+        total = sum(j.total for j in jobs)
+        name = jobs[0].group if len(jobs) == 1 else f"{len(jobs)} countries"
+        paused = " (paused)" if all(j.paused for j in jobs) else ""
+        self.status_label.configure(text=f"Testing {name}: {done}/{total} ({done / max(total, 1) * 100:.0f}%){paused}")
+        
+    def _on_cat_test_done(self, job):
+        group = job.group
+        if not self.channel_manager.running_jobs():
+            self.btn_db_status.configure(state="normal")
+        skipped = f", {job.skipped} skipped (host down)" if job.skipped else ""
+        if job.cancelled:
+            self._set_status_ready(f"Stopped testing {group}: {job.alive} online, {job.dead} removed{skipped}.")
+        else:
+            self._set_status_ready(f"Verified {group}: {job.alive} online, {job.dead} removed{skipped}.")
+        self._update_category_count(group)
+        
+        # Completed jobs reorder the group (best streams first), show that order
+        item_id = self.category_items.get(group)
+        if not job.cancelled and item_id in self.expanded_items:
+             self._collapse_category(item_id)
+             self._expand_category(item_id)
 
     # --- Favorites Logic ---
     def refresh_favorites_view(self):
         for w in self.fav_channels_frame.winfo_children(): w.destroy()
         for w in self.fav_countries_frame.winfo_children(): w.destroy()
         
-        for ch in self.fav_manager.favorites["channels"]:
+        for pos, ch in enumerate(self.fav_manager.channels(self.fav_sort)):
             f = ctk.CTkFrame(self.fav_channels_frame, height=50, fg_color=Theme.SURFACE_2, corner_radius=8)
             f.pack(fill="x", pady=4); f.pack_propagate(False)
             
-            btn = ctk.CTkButton(f, text=f" {str(ch['name'])}", anchor="w", fg_color="transparent", 
-                          text_color=Theme.TEXT_WHITE, font=("Segoe UI", 12), hover_color=Theme.SURFACE_3,
-                          command=lambda u=ch['url']: self.play_stream({'url':u}))
+            offline = ch.get('offline')
+            btn = ctk.CTkButton(f, text=f" {str(ch['name'])}" + ("  (offline)" if offline else ""), anchor="w", fg_color="transparent", 
+                          text_color=Theme.TEXT_DARK if offline else Theme.TEXT_WHITE, font=("Segoe UI", 12), hover_color=Theme.SURFACE_3,
+                          command=lambda c=ch: self.play_stream(c))
             btn.pack(side="left", fill="both", expand=True, padx=5)
             
             ctk.CTkButton(f, text="✕", width=30, fg_color="transparent", hover_color=Theme.ERROR, 
                           text_color=Theme.ERROR, command=lambda u=ch['url']: self.rem_fav_channel(u)).pack(side="right", padx=10)
             
-        for co in self.fav_manager.favorites["countries"]:
+            # Reordering only makes sense in the custom order
+            if self.fav_sort == SORT_ADDED:
+                for arrow, step in (("▼", 1), ("▲", -1)):
+                    ctk.CTkButton(f, text=arrow, width=26, fg_color="transparent", hover_color=Theme.SURFACE_3,
+                                  text_color=Theme.TEXT_GRAY, command=lambda u=ch['url'], p=pos + step: self.move_fav_channel(u, p)).pack(side="right")
+            
+        for co in self.fav_manager.countries():
             f = ctk.CTkFrame(self.fav_countries_frame, height=50, fg_color=Theme.SURFACE_2, corner_radius=8)
             f.pack(fill="x", pady=4); f.pack_propagate(False)
             
@@ -585,8 +928,23 @@ class StreamHunterApp(ctk.CTk):
             ctk.CTkButton(f, text="✕", width=30, fg_color="transparent", hover_color=Theme.ERROR,
                           text_color=Theme.ERROR, command=lambda c=co: self.rem_fav_country(c)).pack(side="right", padx=10)
             
-    def add_fav_channel(self, name, url, group):
-        self.fav_manager.add_channel({'name':name, 'url':url, 'group':group})
+    def set_fav_sort(self, sort):
+        self.fav_sort = sort
+        self.refresh_favorites_view()
+        
+    def move_fav_channel(self, url, index):
+        if index < 0: return
+        if self.fav_manager.move_channel(url, index):
+            self.refresh_favorites_view()
+            
+    def add_fav_channel(self, name, url, group, stream_info=None):
+        info = {'name':name, 'url':url, 'group':group}
+        # Keep header hints so the favorite plays like the original did
+        if stream_info:
+            for key in ('user_agent', 'referer'):
+                if stream_info.get(key): info[key] = stream_info.get(key)
+        self.fav_manager.add_channel(info)
+        self.channel_manager.scheduler.set_favorites(self.fav_manager.channels())
         self._set_status_ready(f"Added {name} to favorites")
         
     def add_fav_country(self, country):
@@ -595,6 +953,7 @@ class StreamHunterApp(ctk.CTk):
         
     def rem_fav_channel(self, url):
         self.fav_manager.remove_channel(url)
+        self.channel_manager.scheduler.set_favorites(self.fav_manager.channels())
         self.refresh_favorites_view()
         
     def rem_fav_country(self, country):
@@ -618,33 +977,34 @@ class StreamHunterApp(ctk.CTk):
             self.status_label.configure(text="Error saving playlist", text_color=Theme.ERROR)
 
     def cleanup_favorites_on_start(self):
-        # Auto-test favorites on startup
+        # Auto-test favorites on startup; dead ones are marked offline, not deleted
+        favs = self.fav_manager.due_channels()
+        if not favs: return
+        
+        self.status_label.configure(text=f"Auto-Verifying {len(favs)} Favorites...", text_color=Theme.ACCENT_SECONDARY)
+        
+        headers = {}
+        for ch in favs:
+            h = {}
+            if ch.get('user_agent'): h['User-Agent'] = ch['user_agent']
+            if ch.get('referer'): h['Referer'] = ch['referer']
+            if h: headers[ch['url']] = h
+            
         def _check():
-             valid_count = 0
-             removed_count = 0
-             favs = self.fav_manager.favorites["channels"][:] # Copy list safely
-             
-             if not favs: return
-             
-             self.after(0, lambda: self.status_label.configure(text=f"Auto-Verifying {len(favs)} Favorites...", text_color=Theme.ACCENT_SECONDARY))
-             
-             for ch in favs:
-                 # Use the robust check from channel manager
-                 if self.channel_manager.verify_stream_url(ch['url']):
-                     valid_count += 1
-                 else:
-                     self.fav_manager.remove_channel(ch['url'])
-                     removed_count += 1
-                     
-             self.after(0, lambda: self._on_fav_check_complete(valid_count, removed_count))
+             # Checked concurrently by the channel manager's prober
+             results = self.channel_manager.verify_urls([ch['url'] for ch in favs], headers=headers)
+             self.after(0, lambda: self._on_fav_check_complete(results))
              
         threading.Thread(target=_check, daemon=True).start()
 
-    def _on_fav_check_complete(self, valid, removed):
-        if removed > 0:
-            msg = f"Cleaned Favorites: {valid} Online, {removed} Dead Removed."
-            self.refresh_favorites_view() # Refresh UI if items removed
+    def _on_fav_check_complete(self, results):
+        # One batched update (and one save) for every result; breaker skips are no verdict
+        results = {url: r for url, r in results.items() if not r.skipped}
+        valid, offline = self.fav_manager.apply_results(results)
+        self.channel_manager.scheduler.set_favorites(self.fav_manager.channels())
+        if offline > 0:
+            msg = f"Favorites Verified: {valid} Online, {offline} Offline (will retry)."
         else:
             msg = f"Favorites Verified: All {valid} Online."
-            
+        self.refresh_favorites_view()
         self._set_status_ready(msg)